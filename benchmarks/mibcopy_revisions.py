@@ -0,0 +1,73 @@
+"""
+Per-file cost of reading MIB revisions the way parser/mibcopy.py does, with a
+new compiler and readers for every file, against a long-lived compiler
+context shared by all the files of the run.
+
+    python -m benchmarks.mibcopy_revisions <DIRECTORY> [SOURCE-URI...]
+"""  #
+import os
+import sys
+import time
+
+from pysmi.codegen import JsonCodeGen
+from pysmi.compiler import MibCompiler
+from pysmi.parser import SmiV1CompatParser
+from pysmi.reader import FileReader, getReadersFromUrls
+from pysmi.writer import CallbackWriter
+
+from parser.context import CompilerContext
+
+COMPILE_OPTIONS = dict(noDeps=True, rebuild=True, fuzzyMatching=False)
+
+
+def fresh_compilers(directory, sources):
+    parser = SmiV1CompatParser()
+    codegen = JsonCodeGen()
+    writer = CallbackWriter(lambda *x: None)
+
+    def compiler():
+        mibcompiler = MibCompiler(parser, codegen, writer)
+        mibcompiler.addSources(FileReader(directory, recursive=False), *getReadersFromUrls(*sources))
+        return mibcompiler
+
+    return compiler
+
+
+def context_compilers(directory, sources):
+    context = CompilerContext(
+        SmiV1CompatParser(), JsonCodeGen(), CallbackWriter(lambda *x: None), *getReadersFromUrls(*sources)
+    )
+
+    return lambda: context.compiler(directory, lambda: FileReader(directory, recursive=False))
+
+
+def run(compilers, files):
+    revisions = {}
+    started = time.perf_counter()
+    for mibfile in files:
+        processed = compilers().compile(mibfile, **COMPILE_OPTIONS)
+        revisions[mibfile] = sorted((name, str(status), getattr(status, 'revision', None))
+                                    for name, status in processed.items())
+    return time.perf_counter() - started, revisions
+
+
+def main(directory, *sources):
+    directory = os.path.abspath(directory)
+    files = sorted(name for name in os.listdir(directory) if os.path.isfile(os.path.join(directory, name)))
+    sources = sources or ('file:///usr/share/snmp/mibs',)
+
+    before, expected = run(fresh_compilers(directory, sources), files)
+    after, revisions = run(context_compilers(directory, sources), files)
+
+    print('files: %d' % len(files))
+    print('compiler per file: %.2f ms/file' % (before * 1000 / max(len(files), 1)))
+    print('compiler context:  %.2f ms/file' % (after * 1000 / max(len(files), 1)))
+    print('same results: %s' % (revisions == expected))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.stderr.write(__doc__)
+        sys.exit(64)
+
+    main(*sys.argv[1:])
@@ -0,0 +1,49 @@
+"""
+Cold start of the web app: time to import main.py in a fresh interpreter,
+then time to answer the first request of each kind, which is when the
+engines it needs get loaded.
+
+    python -m benchmarks.startup [RUNS]
+"""  #
+import statistics
+import subprocess
+import sys
+import time
+
+FIRST_REQUESTS = [
+    ('GET', '/vendor', None),
+    ('GET', '/search/fan', None),
+    ('POST', '/oid/translate', ['1.3.6.1.2.1.1.1.0']),
+]
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import main
+times = {'import main': time.perf_counter() - started}
+client = main.app.test_client()
+for method, url, body in json.loads(sys.argv[1]):
+    started = time.perf_counter()
+    client.open(url, method=method, json=body).get_data()
+    times['first %s %s' % (method, url)] = time.perf_counter() - started
+print(json.dumps(times))
+'''
+
+
+def main(runs=5):
+    import json
+
+    samples = {}
+    for _ in range(int(runs)):
+        started = time.perf_counter()
+        output = subprocess.check_output([sys.executable, '-c', PROBE, json.dumps(FIRST_REQUESTS)])
+        samples.setdefault('interpreter and import main', []).append(time.perf_counter() - started)
+        for step, elapsed in json.loads(output).items():
+            samples.setdefault(step, []).append(elapsed)
+
+    for step, times in samples.items():
+        print('%-30s %8.1f ms (median of %d)' % (step, statistics.median(times) * 1000, len(times)))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -1,94 +1,93 @@
 import json
+import re
+from itertools import islice
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Frame, PageTemplate
 from reportlab.lib.styles import getSampleStyleSheet
 from datetime import datetime, timezone, timedelta
 
+# Characters of the compiled module read at a time by the streaming exporter
+CHUNK_SIZE = 65536
 
-def parseJSON():
-    tableData = []
-    counter = 0
-    titles = []
-    dataPDF = []
-    
+# Rows per table, longer tables are split with their header row repeated
+TABLE_CHUNK_ROWS = 200
+
+# Flowables held ahead of the one being laid out
+FLOWABLE_WINDOW = 16
+
+WHITESPACE = re.compile(r'\s*')
+
+IMPORTS_TITLE = 'Required Imports'
+
+
+def parseJSON(source='data3.json', filename="table.pdf"):
     # Load the JSON data from file
-    with open('data3.json', 'r') as json_file:
+    with open(source, 'r') as json_file:
         data = json.load(json_file)
 
-    # Flatten the JSON data and create matrices with each key mapped to a list containing all its values
-    flattened_data = flatten_json(data)
-    key_matrix = {key: flattened_data[key] for key in flattened_data}
-
-   
-    for key, matrix in key_matrix.items():
-        current = key.split('.')
-        if (current[0] == "imports"):
-            if (counter == 0):
-                tableData = [['Class', 'Element']]
-                counter = 1
-                titles.append('Required Imports')
-            else:
-                for i in range(len(matrix)):
-                    tableData.append([current[1], matrix[i]])
-    dataPDF.append(tableData)
-
-    tableData = []
-
-    for key, matrix in key_matrix.items():
-        counter = 0
-        current = key.split('.')
-        
-        if (current[0] != "imports" and current[0] != "meta"):
-            if (counter == 0 and (current[0] not in titles)):
-                titles.append(current[0])
-                dataPDF.append(tableData)
-                tableData = []
-                counter = 1
-                tableData.append([current[1].capitalize(), matrix[0]])
-            else:
-                if (current[1] == 'revisions'):
-                    continue
-                elif(current[1] == 'lastupdated'):
-                    input_format = "%Y%m%d%H%M"
-                    parsed_date = datetime.strptime(matrix[0][:-1], input_format)
-
-                    # Manually add the UTC timezone information
-                    parsed_date = parsed_date.replace(tzinfo=timezone.utc)
-
-                    # Define your desired output format
-                    output_format = "%Y-%m-%d %H:%M:%S %Z"
-
-                    # Convert the UTC time to the desired output format with timezone representation
-                    formatted_date = parsed_date.strftime(output_format)
-                    tableData.append([current[1].capitalize(), formatted_date])
-                else:
-                    for i in range(len(matrix)):
-                        tableData.append([current[1].capitalize(), matrix[i]])
-    dataPDF.append(tableData)                
-    dataPDF.remove([])
+    # Tables of the flattened data in a single pass, the imports laid out first
+    tables = list(section_tables(flatten_json(data)))
+    tables.sort(key=lambda table: table[0] != IMPORTS_TITLE)
+
     element = []
-    for i in range(len(titles)):
-        value = create_pdf_table(dataPDF[i], titles[i])
-        element.append(value[0])
-        element.append(value[1])
-    makePDF(element)
-
-
-def flatten_json(data, prefix=''):
-    items = {}
-    if isinstance(data, dict):
-        for key, value in data.items():
-            new_prefix = f"{prefix}.{key}" if prefix else key
-            items.update(flatten_json(value, prefix=new_prefix))
-    elif isinstance(data, list):
-        if prefix in items:
-            items[prefix].extend(data)
+    for title, tableData in tables:
+        element.extend(create_pdf_table(tableData, title))
+    makePDF(element, filename)
+
+
+# (path, values) of every leaf of the JSON data, in document order. Lists are
+# leaves, scalars come as a single value list. Nested objects are walked with
+# a stack of iterators, nothing is built per level.
+def flatten_json(data, path=()):
+    if not isinstance(data, dict):
+        yield path, data if isinstance(data, list) else [data]
+        return
+
+    stack = [(path, iter(data.items()))]
+    while stack:
+        path, items = stack[-1]
+        for key, value in items:
+            if isinstance(value, dict):
+                stack.append((path + (key,), iter(value.items())))
+                break
+            yield path + (key,), value if isinstance(value, list) else [value]
+        else:
+            stack.pop()
+
+
+# (title, rows) of the table of every top level section of the flattened data,
+# in order. The first field of a section is the header row of its table, the
+# imports get a header of their own and list every imported symbol.
+def section_tables(flattened):
+    section = rows = None
+    for path, values in flattened:
+        if path[0] != section:
+            if rows:
+                yield IMPORTS_TITLE if section == 'imports' else section, rows
+            section = path[0]
+            if section == 'meta':
+                rows = None
+            elif section == 'imports':
+                # the first field, the class of the section, isn't listed
+                rows = [['Class', 'Element']]
+            else:
+                rows = [[path[1].capitalize(), values[0]]]
+            continue
+
+        field = path[1]
+        if rows is None or field == 'revisions':
+            continue
+        elif section == 'imports':
+            rows.extend([field, value] for value in values)
+        elif field == 'lastupdated':
+            rows.append([field.capitalize(), format_lastupdated(values[0])])
         else:
-            items[prefix] = data
-    else:
-        items[prefix] = [data]
-    return items
+            rows.extend([field.capitalize(), value] for value in values)
+
+    if rows:
+        yield IMPORTS_TITLE if section == 'imports' else section, rows
 
 def create_pdf_table(data, title, min_table_width = 200, max_table_width = 1000, max_text_length=50):
     
@@ -109,7 +108,18 @@ def create_pdf_table(data, title, min_table_width = 200, max_table_width = 1000,
 
   
     
-    style = TableStyle([
+    style = pdf_table_style()
+    table.setStyle(style)
+    # Loop through the table data and modify text that exceeds max_text_length
+ 
+
+    
+    elements.append(table)
+    return elements
+    
+
+def pdf_table_style():
+    return TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), '#3b82f6'),
         ('TEXTCOLOR', (0, 0), (-1, 0), '#ffffff'),
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -122,18 +132,129 @@ def create_pdf_table(data, title, min_table_width = 200, max_table_width = 1000,
         ('GRID', (0, 0), (-1, -1), 1, '#C8C8C8'),
         ('FONTSIZE', (0, 1), (-1, -1), 8),
     ])
-    table.setStyle(style)
-    # Loop through the table data and modify text that exceeds max_text_length
- 
 
-    
-    elements.append(table)
-    return elements
-    
-
-def makePDF(dataWrite):
-    doc = SimpleDocTemplate("table.pdf", pagesize=letter)
+def makePDF(dataWrite, filename="table.pdf"):
+    doc = SimpleDocTemplate(filename, pagesize=letter)
     doc.build(dataWrite)
 
+
+
+# (key, value) of the members of the top level JSON object in the file, read
+# a chunk at a time: only the member being decoded is held in memory
+def iter_members(json_file, chunk_size=CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def token(decode):
+        nonlocal buffer, position, eof
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position < len(buffer):
+                if not decode:
+                    position += 1
+                    return buffer[position - 1]
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                    # a number or literal may go on in the next chunk
+                    if end < len(buffer) or eof:
+                        position = end
+                        return value
+                except ValueError:
+                    if eof:
+                        raise
+            elif eof:
+                raise ValueError('unexpected end of JSON data')
+            chunk = json_file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+    if token(False) != '{':
+        raise ValueError('expected a JSON object')
+    if token(False) == '}':
+        return
+    position -= 1
+
+    while True:
+        key = token(True)
+        if not isinstance(key, str) or token(False) != ':':
+            raise ValueError('expected an object member')
+        yield key, token(True)
+
+        separator = token(False)
+        if separator == '}':
+            return
+        if separator != ',':
+            raise ValueError('expected , or }')
+
+
+def format_lastupdated(value):
+    parsed_date = datetime.strptime(value[:-1], "%Y%m%d%H%M").replace(tzinfo=timezone.utc)
+    return parsed_date.strftime("%Y-%m-%d %H:%M:%S %Z")
+
+
+# Title and tables of the rows, TABLE_CHUNK_ROWS rows at most per table
+def table_flowables(rows, title, title_style, table_style, min_table_width=200, max_table_width=1000):
+    yield Paragraph(title, title_style)
+
+    columns = len(rows[0])
+    available_width = max(min_table_width, min(max_table_width, max_table_width / columns))
+    for start in range(1, max(len(rows), 2), TABLE_CHUNK_ROWS):
+        table = Table([rows[0]] + rows[start:start + TABLE_CHUNK_ROWS],
+                      colWidths=[available_width / columns] * columns)
+        table.setStyle(table_style)
+        yield table
+
+
+# Flowables of the module, the imports and then a table per symbol, as its
+# members are read
+def module_flowables(members):
+    title_style = getSampleStyleSheet()["Title"]
+    title_style.textColor = '#3b82f6'
+    table_style = pdf_table_style()
+
+    for key, value in members:
+        if isinstance(value, dict):
+            for title, rows in section_tables(flatten_json(value, (key,))):
+                yield from table_flowables(rows, title, title_style, table_style)
+
+
+# Lays flowables out as they are produced instead of from a complete story, so
+# only the page being filled and a few flowables ahead are held in memory
+class StreamingDocTemplate(SimpleDocTemplate):
+
+    def buildStream(self, flowables, canvasmaker=canvas.Canvas):
+        self._calc()
+        frameT = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='normal')
+        self.addPageTemplates([PageTemplate(id='First', frames=frameT, pagesize=self.pagesize),
+                               PageTemplate(id='Later', frames=frameT, pagesize=self.pagesize)])
+        self._startBuild(canvasmaker=canvasmaker)
+
+        canv = self.canv
+        flowables = iter(flowables)
+        pending = []
+        try:
+            canv._doctemplate = self
+            while True:
+                pending.extend(islice(flowables, FLOWABLE_WINDOW - len(pending)))
+                if not pending:
+                    break
+                self.clean_hanging()
+                self.handle_flowable(pending)
+        finally:
+            del canv._doctemplate
+
+        self._endBuild()
+
+
+# Export the compiled module in the JSON file to a PDF file, page by page
+def streamPDF(source, filename="table.pdf"):
+    with open(source, 'r') as json_file:
+        doc = StreamingDocTemplate(filename, pagesize=letter)
+        doc.buildStream(module_flowables(iter_members(json_file)))
+
+
 if __name__ == "__main__":
     parseJSON()
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+PDF exports of the compiled modules, cached under the hash of the module
+JSON and of the renderer version, so a module is only rendered again when
+it changes.
+"""  #
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+from settings import BASE_URL
+
+PARSED_FOLDER = BASE_URL.joinpath("uploads", "parsed")
+
+PDF_FOLDER = BASE_URL.joinpath("uploads", "pdf")
+
+# Bump when the PDF layout changes, every module is then rendered again
+RENDERER_VERSION = '1'
+
+MODULE_NAME_RE = re.compile(r'^[A-Za-z][\w-]*$')
+
+# Modification time and size of the JSON of a module and the hash its export
+# is cached under, by path of the JSON, so unchanged modules aren't hashed on
+# every request
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def _digest(path):
+    stat = os.stat(path)
+    stamp = stat.st_mtime_ns, stat.st_size
+    cached = _digests.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    digest = hashlib.sha256(RENDERER_VERSION.encode())
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+
+    with _digests_lock:
+        _digests[path] = stamp, digest.hexdigest()
+    return digest.hexdigest()
+
+
+# Path of the PDF export of the module, rendered if not cached yet, or None if
+# there is no such compiled module
+def module_pdf(module, parsed=PARSED_FOLDER, folder=PDF_FOLDER):
+    if not MODULE_NAME_RE.match(module) or module == 'index':
+        return None
+
+    source = parsed.joinpath(module + '.json')
+    try:
+        digest = _digest(source)
+    except FileNotFoundError:
+        return None
+
+    target = folder.joinpath(digest + '.pdf')
+    if target.exists():
+        return target
+
+    # reportlab is only needed once a module is actually rendered
+    from export.PDFCreator import streamPDF
+
+    folder.mkdir(parents=True, exist_ok=True)
+    # rendered aside and moved in place, concurrent requests never see half a PDF
+    descriptor, temporary = tempfile.mkstemp(suffix='.pdf.tmp', dir=folder)
+    os.close(descriptor)
+    try:
+        streamPDF(source, temporary)
+        os.replace(temporary, target)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+    return target
@@ -1,12 +1,23 @@
 import json
 import os
-from pathlib import Path
 
-from flask import Flask, request, jsonify, flash, redirect, send_from_directory
+from flask import Flask, Response, request, jsonify, flash, redirect, send_file, url_for
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
 
-UPLOAD_FOLDER = 'uploads'
+# Only what every request needs is imported at boot. The compile jobs, search
+# corpus, OID index and PDF export are imported by the routes using them, on
+# first use: workers come and go and cold starts should only pay for Flask.
+from settings import UPLOAD_FOLDER, VENDORS
+
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 500
+
+# Fields of the nodes listed by /tree unless asked otherwise
+TREE_FIELDS = ('oid', 'name', 'type', 'nodetype', 'mib_module', 'children')
+
+# Number of translated OIDs encoded per chunk of the streamed response
+TRANSLATE_CHUNK_SIZE = 1000
 
 app = Flask(__name__)
 CORS(app)
@@ -16,12 +27,26 @@ app.config['SESSION_TYPE'] = 'filesystem'
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+for folder in ('mibs', 'parsed', 'pdf'):
+    UPLOAD_FOLDER.joinpath(folder).mkdir(parents=True, exist_ok=True)
+
 
 def is_zip(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ['zip']
 
 
+# Response of a cached result, or a 304 if the client has it already
+def cached_response(entry):
+    if request.if_none_match.contains(entry.etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry.body, mimetype='application/json')
+        response.headers.update(entry.headers)
+    response.set_etag(entry.etag)
+    return response
+
+
 @app.route('/mib/upload', methods=['GET', 'POST'])
 def upload_mib():
     if request.method == 'POST':
@@ -31,7 +56,14 @@ def upload_mib():
         file = request.files['file']
         filename = secure_filename(file.filename)
         file.save(os.path.join(app.config['UPLOAD_FOLDER'], "mibs", filename))
-        return  jsonify(json.load(open(Path("mockups", "upload_mib.json"))))
+
+        from parser.jobs import JOB_QUEUED, get_job_queue
+
+        # Compiling is left to the background workers, poll the job for its progress
+        job_id = get_job_queue().submit(filename)
+        response = jsonify({'job': job_id, 'status': JOB_QUEUED})
+        response.headers['Location'] = url_for('upload_status', job_id=job_id)
+        return response, 202
 
     return '''
         <!doctype html>
@@ -44,24 +76,145 @@ def upload_mib():
         '''
 
 
+@app.route('/mib/upload/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    from parser.jobs import get_job
+
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(job)
+
+
 @app.route('/search/<term>', methods=['GET'])
 def search_oid(term):
-    args = request.args
-    print(args)
-    print(term)
-    return jsonify(json.load(open(Path("mockups", "search.json"))))
+    from search.corpus import SEARCH_FILTERS, get_corpus, parse_fields
+    from search.resultcache import get_result_cache
 
+    args = request.args
+    try:
+        fields = parse_fields(args.get('fields'))
+    except ValueError as ex:
+        return jsonify({'error': str(ex)}), 400
+
+    filters = {key: args[key] for key in SEARCH_FILTERS if args.get(key)}
+    page = max(args.get('page', 1, type=int), 1)
+    per_page = min(max(args.get('per_page', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
+
+    order = 'tree' if args.get('order') == 'tree' else 'relevance'
+
+    corpus = get_corpus()
+    cache = get_result_cache()
+    # Results are cached until an upload changes the corpus. Substring matches
+    # don't depend on case, ranked queries do, camelCase is split into words.
+    cache.validate(corpus.generation)
+    key = (
+        'search', term.lower() if order == 'tree' else ' '.join(term.split()), order,
+        tuple(sorted((name, value.lower()) for name, value in filters.items())),
+        tuple(fields) if fields else None, page, per_page,
+    )
+    entry = cache.get(key)
+    if entry is None:
+        start = (page - 1) * per_page
+
+        # Most relevant first unless the substring matches are asked for in tree
+        # order, only the latter are all found and counted
+        if order == 'tree':
+            nodes = corpus.search(term, **filters)
+            response = jsonify([corpus.record(node, fields) for node in nodes[start:start + per_page]])
+            headers = {'X-Total-Count': str(len(nodes))}
+        else:
+            nodes = corpus.rank(term, start + per_page, **filters)
+            response = jsonify([corpus.record(node, fields) for node in nodes[start:]])
+            headers = {}
+
+        entry = cache.put(key, response.get_data(), headers)
+
+    return cached_response(entry)
+
+
+# Children of a node, or the roots of the tree, to expand search hits one level
+# at a time instead of sending whole subtrees. Records carry how many children
+# each node has, fields can be narrowed down like in /search.
+@app.route('/tree', methods=['GET'])
+@app.route('/tree/<oid>', methods=['GET'])
+def tree_children(oid=None):
+    from search.corpus import get_corpus, parse_fields
 
+    args = request.args
+    try:
+        fields = parse_fields(args.get('fields')) or TREE_FIELDS
+    except ValueError as ex:
+        return jsonify({'error': str(ex)}), 400
+
+    corpus = get_corpus()
+    nodes = corpus.children(oid)
+    if nodes is None:
+        return jsonify({'error': 'unknown OID'}), 404
+
+    page = max(args.get('page', 1, type=int), 1)
+    per_page = min(max(args.get('per_page', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
+    start = (page - 1) * per_page
+
+    response = jsonify([corpus.record(node, fields) for node in nodes[start:start + per_page]])
+    response.headers['X-Total-Count'] = len(nodes)
+    return response
+
+
+# Translate numeric OIDs, given as a JSON array or one per line, into the
+# objects they belong to. The response is streamed as a JSON array.
+@app.route('/oid/translate', methods=['POST'])
+def translate_oids():
+    if request.is_json:
+        oids = request.get_json(silent=True)
+        if not isinstance(oids, list) or not all(isinstance(oid, str) for oid in oids):
+            return jsonify({'error': 'expected a JSON array of OIDs'}), 400
+    else:
+        oids = [line.strip() for line in request.get_data(as_text=True).splitlines() if line.strip()]
+
+    from search.oidindex import get_oid_index
+
+    # The OID index is memory mapped, the corpus is only loaded while there is none
+    index = get_oid_index()
+    if index is not None:
+        translate = index.translate
+    else:
+        from search.corpus import get_corpus
+
+        translate = get_corpus().translate
+
+    def generate():
+        yield '['
+        for start in range(0, len(oids), TRANSLATE_CHUNK_SIZE):
+            chunk = ','.join(json.dumps(translate(oid)) for oid in oids[start:start + TRANSLATE_CHUNK_SIZE])
+            yield (',' if start else '') + chunk
+        yield ']'
+
+    return Response(generate(), mimetype='application/json')
+
+
+# PDF export of a compiled module, named in the path or the module query
+# string argument, rendered on the first request after the module changed and
+# served from the cache afterwards
 @app.route('/mib/download/', methods=['GET'])
-def download_pdf():
-    return send_from_directory(Path("mockups"), "example.pdf")
+@app.route('/mib/download/<module>', methods=['GET'])
+def download_module_pdf(module=None):
+    from export.pdfcache import module_pdf
+
+    module = module or request.args.get('module', '')
+
+    path = module_pdf(module)
+    if path is None:
+        return jsonify({'error': 'unknown module'}), 404
+    return send_file(path, mimetype='application/pdf', download_name=module + '.pdf', etag=path.stem)
 
 
 @app.route('/vendor', methods=['GET'])
 def vendor():
-    return jsonify({
-        "34578": "hpe",
-        "632": "aruba",
-        "54345": "cisco",
-        "65346546": "ibm",
-    })
+    from search.resultcache import get_result_cache
+
+    cache = get_result_cache()
+    entry = cache.get(('vendor',))
+    if entry is None:
+        entry = cache.put(('vendor',), jsonify(VENDORS).get_data())
+    return cached_response(entry)
@@ -0,0 +1,91 @@
+"""
+Remember which MIB sources were already compiled into uploads/parsed, keyed
+by the SHA-256 of their text and of the compiler options, so re-uploading
+unchanged MIBs doesn't parse them again.
+"""  #
+import hashlib
+import json
+import os
+import tempfile
+
+from pysmi import __version__ as pysmiVersion
+from pysmi.compiler import statusUntouched
+
+# MibStatus attributes buildIndex needs, kept to report cached modules
+STATUS_ATTRIBUTES = ('path', 'file', 'alias', 'oid', 'oids', 'identity', 'revision', 'enterprise', 'compliance')
+
+
+# OIDs come in sets, which JSON has no notion of
+def _portable(value):
+    if isinstance(value, (set, frozenset, tuple)):
+        return sorted(value)
+    return value
+
+
+class CompileCache:
+
+    def __init__(self, path, parsed, options):
+        self.path = path
+        self.parsed = parsed
+        self.options = json.dumps(options, sort_keys=True) + pysmiVersion
+        self.entries = {}
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+        return self
+
+    def save(self):
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(str(self.path)), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(self.entries, file)
+            os.replace(temporary, str(self.path))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def digest(self, text):
+        return hashlib.sha256((self.options + '\0' + text).encode('utf-8', 'surrogateescape')).hexdigest()
+
+    # Modification time and size of the JSON a module was compiled into, None
+    # if there is none
+    def output_stamp(self, module):
+        try:
+            stat = os.stat(self.parsed.joinpath(module + '.json'))
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    # Split the sources into the results of the ones already compiled and the
+    # names of the ones still to compile. A source only counts as compiled
+    # while the JSON of its module is still the one it was compiled into,
+    # another source of the same module may have overwritten it since.
+    def lookup(self, sources):
+        results = {}
+        pending = []
+        for name, text in sources.items():
+            entry = self.entries.get(self.digest(text))
+            if entry and entry.get('output') and entry['output'] == self.output_stamp(entry['module']):
+                results[entry['module']] = statusUntouched.setOptions(**entry['status'])
+            else:
+                pending.append(name)
+        return results, pending
+
+    # Remember the modules compiled out of the sources
+    def update(self, sources, results):
+        compiled = {
+            status.alias: (module, status)
+            for module, status in results.items() if status == 'compiled'
+        }
+        for name, text in sources.items():
+            if name in compiled:
+                module, status = compiled[name]
+                self.entries[self.digest(text)] = {
+                    'module': module,
+                    'output': self.output_stamp(module),
+                    'status': {key: _portable(getattr(status, key, None)) for key in STATUS_ATTRIBUTES},
+                }
@@ -11,30 +11,41 @@ Here we expect to deal only with SMIv2-valid MIBs.
 We use noDeps flag to prevent MIB compiler from attemping
 to compile IMPORT'ed MIBs as well.
 """  #
-import zipfile
-from pathlib import Path
+import fcntl
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
 
+from pysmi import error
 from pysmi.codegen import JsonCodeGen
 from pysmi.compiler import MibCompiler, MibStatus
 from pysmi.parser import SmiV2Parser
-from pysmi.reader import getReadersFromUrls
 from pysmi.writer import FileWriter
 
-from settings import BASE_URL
+from parser.cache import CompileCache
+from parser.header import module_imports
+from parser.ingest import MemoryReader, iter_modules
+from parser.mirror import MibMirror, MirrorReader
+from search.corpus import log_compiled
+from search.oidindex import update_index
+from settings import BASE_URL, COMPILE_WORKERS
 
+COMPILE_OPTIONS = dict(noDeps=True, rebuild=True, genTexts=True)
 
-def mibs_list(file):
-    if zipfile.is_zipfile(file.open("rb")):
-        with zipfile.ZipFile(file) as f:
-            return f.namelist()
-    return [file.name]
+# Lock file of the parsed folder, see parsed_lock
+PARSED_LOCK_NAME = '.compile.lock'
 
 
-def compile(filename):
-    file = BASE_URL.joinpath("uploads", "mibs", filename)
+# Text of every MIB module of the upload (a zip archive or a single MIB file),
+# by module name, read in a single pass. The first member declaring a module wins.
+def mib_sources(file, progress=None):
+    sources = {}
+    for _, module, text in iter_modules(file, progress):
+        sources.setdefault(module, text)
+    return sources
 
-    files = mibs_list(file)
 
+def make_compiler(sources, name=''):
     mibcompiler = MibCompiler(
         SmiV2Parser(),
         JsonCodeGen(),
@@ -43,23 +54,148 @@ def compile(filename):
     )
 
     mibcompiler.addSources(
-        *getReadersFromUrls(
-            *[
-                file.as_uri()
-                if zipfile.is_zipfile(file)
-                else BASE_URL.joinpath("uploads", "mibs").as_uri(),
-                BASE_URL.joinpath("mibs", "rfc").as_uri(),
-                "https://bestmonitoringtools.com/mibdb/mibs/@mib@"
-            ],
-            **dict(fuzzyMatching=True)
-        )
+        # the upload is served from memory, it was already read once
+        MemoryReader(name, sources),
+        # imports are resolved offline, from mibs/rfc and the previous uploads
+        MirrorReader(MibMirror().load())
     )
 
-    results = mibcompiler.compile(*files, **dict(noDeps=True,
-                                              rebuild=True,
-                                              genTexts=True))
+    return mibcompiler
+
+
+# Modules of the upload each module imports
+def dependencies(sources):
+    return {
+        module: {imported for imported in module_imports(text) if imported in sources} - {module}
+        for module, text in sources.items()
+    }
+
+
+# Modules sorted so that the ones each imports come before it. Import cycles
+# are broken by name order.
+def dependency_order(graph):
+    order = []
+    pending = dict(graph)
+    while pending:
+        ready = sorted(module for module, depends in pending.items() if not depends & pending.keys())
+        if not ready:
+            ready = [min(pending)]
+        for module in ready:
+            del pending[module]
+        order.extend(ready)
+
+    return order
+
+
+# The modules and everything they import from the upload, transitively
+def closure(modules, graph):
+    seen = set()
+    pending = list(modules)
+    while pending:
+        module = pending.pop()
+        if module not in seen:
+            seen.add(module)
+            pending.extend(graph.get(module, ()))
+    return seen
+
+
+# Split the ordered modules into at most the given number of contiguous runs
+# of similar source size, so modules close in the import graph, which share
+# most of their dependencies, are compiled by the same worker
+def partition(names, sources, parts):
+    total = sum(len(sources[name]) for name in names)
+    target = total / parts if parts else total
+
+    partitions = [[]]
+    size = 0
+    for name in names:
+        if size >= target * len(partitions) and len(partitions) < parts:
+            partitions.append([])
+        partitions[-1].append(name)
+        size += len(sources[name])
+
+    return [names for names in partitions if names]
+
+
+# Runs in a worker process, which only gets the sources its modules need.
+# Errors are turned into plain pysmi errors, the ones the compiler raises
+# reference readers and code generators that don't need to cross the process
+# boundary
+def compile_partition(filename, names, sources):
+    results = make_compiler(sources, filename).compile(*names, **COMPILE_OPTIONS)
+
+    for mibname, status in results.items():
+        if hasattr(status, 'error'):
+            results[mibname] = status.setOptions(error=error.PySmiError(str(status.error)))
+
+    return results
+
+
+# A module is reported as untouched by the compilers that only parsed it as a
+# dependency (or found it in the cache), whatever actually compiling it says wins
+def merge_results(results, partial):
+    for mibname, status in partial.items():
+        if mibname not in results or (results[mibname] == 'untouched' and status != 'untouched'):
+            results[mibname] = status
+
+
+# Held while a compile rewrites the files every compile of the parsed folder
+# shares: the compile cache, pysmi's index, the OID index and the corpus
+# journal. Uploads are compiled by several worker processes at once.
+@contextmanager
+def parsed_lock(parsed):
+    parsed.mkdir(parents=True, exist_ok=True)
+    with open(parsed.joinpath(PARSED_LOCK_NAME), 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+# progress, if given, is called for every member of the upload as it is read,
+# see parser.ingest.iter_modules
+def compile(filename, workers=COMPILE_WORKERS, progress=None):
+    file = BASE_URL.joinpath("uploads", "mibs", filename)
+    parsed = BASE_URL.joinpath("uploads", "parsed")
+
+    sources = mib_sources(file, progress)
+
+    # Only the sources that changed since they were last compiled are parsed
+    cache = CompileCache(parsed.joinpath(".compile-cache.json"), parsed, COMPILE_OPTIONS).load()
+    results, modules = cache.lookup(sources)
+
+    mibcompiler = make_compiler(sources, filename)
+
+    if workers > 1 and len(modules) > 1:
+        graph = dependencies(sources)
+        pending = set(modules)
+        partitions = partition([module for module in dependency_order(graph) if module in pending], sources, workers)
+
+        with ProcessPoolExecutor(max_workers=len(partitions)) as pool:
+            for partial in pool.map(
+                    compile_partition, repeat(filename), partitions,
+                    ({module: sources[module] for module in closure(names, graph)} for names in partitions)):
+                merge_results(results, partial)
+
+    elif modules:
+        merge_results(results, mibcompiler.compile(*modules, **COMPILE_OPTIONS))
+
+    compiled = [mibname for mibname, status in results.items() if status == 'compiled']
+
+    with parsed_lock(parsed):
+        # read again, other compiles may have saved their entries meanwhile
+        cache.load()
+        cache.update(sources, results)
+        cache.save()
+
+        mibcompiler.buildIndex(results, ignoreErrors=False)
 
-    mibcompiler.buildIndex(results, ignoreErrors=False)
+        # Only the modules written by this compile are indexed again, lookups
+        # are answered from the binary OID index and searches from the corpus
+        # of the web processes, which take them in from the journal
+        update_index(compiled, parsed)
+        log_compiled(compiled, parsed)
 
     return results
 
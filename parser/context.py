@@ -0,0 +1,80 @@
+"""
+Long-lived compiler context for tools that compile many MIB files one by
+one. The readers of the imported modules, the parser with its grammar
+tables and the parse trees of the imports already resolved are kept across
+files, so only the file itself is read and parsed each time.
+"""  #
+from pysmi import error
+from pysmi.compiler import MibCompiler
+from pysmi.reader.base import AbstractReader
+
+
+# Reader remembering what the reader it wraps served, or didn't find, by
+# module name, and which texts came from it
+class CachingReader(AbstractReader):
+
+    def __init__(self, reader, context):
+        self._reader = reader
+        self._context = context
+        self._data = {}
+
+    def __str__(self):
+        return '%s{%s}' % (self.__class__.__name__, self._reader)
+
+    def getData(self, mibname, **options):
+        if mibname not in self._data:
+            try:
+                self._data[mibname] = self._reader.getData(mibname, **options)
+
+            except error.PySmiReaderFileNotFoundError as ex:
+                self._data[mibname] = ex
+
+        data = self._data[mibname]
+        if isinstance(data, Exception):
+            raise data
+
+        self._context.shared.add(data[1])
+        return data
+
+
+# Parser serving the trees of the texts read through the context readers from
+# memory. Trees are only read by the symbol table and code generators, reusing
+# them across compilations is safe.
+class CachingParser:
+
+    def __init__(self, parser, context):
+        self._parser = parser
+        self._context = context
+
+    def parse(self, data, **options):
+        if data not in self._context.shared:
+            return self._parser.parse(data, **options)
+
+        if data not in self._context.trees:
+            self._context.trees[data] = self._parser.parse(data, **options)
+
+        return self._context.trees[data]
+
+
+class CompilerContext:
+
+    def __init__(self, parser, codegen, writer, *sources):
+        self.codegen = codegen
+        self.writer = writer
+        self.parser = CachingParser(parser, self)
+        self.sources = [CachingReader(source, self) for source in sources]
+        # texts served by the context readers and their parse trees
+        self.shared = set()
+        self.trees = {}
+        self._compilers = {}
+
+    # Compiler looking the modules up in the given reader first, then in the
+    # context readers. Compilers are kept by key, the directory being read
+    # for instance, and the reader is only created for a key not seen yet.
+    def compiler(self, key, reader):
+        if key not in self._compilers:
+            mibcompiler = MibCompiler(self.parser, self.codegen, self.writer)
+            mibcompiler.addSources(reader(), *self.sources)
+            self._compilers[key] = mibcompiler
+
+        return self._compilers[key]
@@ -0,0 +1,60 @@
+"""
+Read what is needed from the header of a MIB module (its name, the
+modules it imports and its revision) with regular expressions, without
+a full parse.
+"""  #
+import re
+from datetime import datetime
+
+DEFINITIONS_RE = re.compile(r'^\s*([A-Za-z][\w-]*)\s+DEFINITIONS\b[^:]*::=\s*BEGIN', re.M)
+
+IMPORTS_RE = re.compile(r'\bIMPORTS\b(.*?);', re.S)
+
+FROM_RE = re.compile(r'\bFROM\s+([A-Za-z][\w-]*)')
+
+MODULE_IDENTITY_RE = re.compile(r'\b[a-z][\w-]*\s+MODULE-IDENTITY\b(.*?)::=', re.S)
+
+REVISION_RE = re.compile(r'\bREVISION\s+"(\d{10}|\d{12})Z"')
+
+# ASN.1 comments run from -- to the end of the line or to the next --
+COMMENT_RE = re.compile(r'--.*?(?:--|$)', re.M)
+
+
+def strip_comments(text):
+    return COMMENT_RE.sub('', text)
+
+
+# Name the module declares itself with or None if this isn't a MIB module
+def module_name(text):
+    match = DEFINITIONS_RE.search(strip_comments(text))
+    return match.group(1) if match else None
+
+
+# Names of the modules imported by the module, in order of appearance
+def module_imports(text):
+    text = strip_comments(text)
+    begin = DEFINITIONS_RE.search(text)
+    match = IMPORTS_RE.search(text, begin.end() if begin else 0)
+    if not match:
+        return []
+    return FROM_RE.findall(match.group(1))
+
+
+# Latest revision of the module, the first REVISION clause of its
+# MODULE-IDENTITY like pysmi reports it, or None if it has none
+def module_revision(text):
+    identity = MODULE_IDENTITY_RE.search(strip_comments(text))
+    if not identity:
+        return None
+
+    revision = REVISION_RE.search(identity.group(1))
+    if not revision:
+        return None
+
+    revision = revision.group(1)
+    try:
+        if len(revision) == 10:
+            return datetime.strptime('19' + revision, '%Y%m%d%H%M')
+        return datetime.strptime(revision, '%Y%m%d%H%M')
+    except ValueError:
+        return None
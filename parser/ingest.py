@@ -0,0 +1,105 @@
+"""
+Read the MIB modules of an upload in a single pass over the archive (memory
+mapped when possible), skipping members that aren't MIB modules by sniffing
+their header, and serve them to pysmi straight from memory.
+"""  #
+import mmap
+import os
+import zipfile
+from contextlib import contextmanager
+
+from pysmi import error
+from pysmi.mibinfo import MibInfo
+from pysmi.reader.base import AbstractReader
+
+from parser.header import module_name
+
+# Module headers are expected within the first bytes of a MIB file
+HEADER_SIZE = 65536
+
+MEMBER_READ = 'read'
+MEMBER_SKIPPED = 'skipped'
+
+
+def _decode(data):
+    return data.decode('utf-8', 'ignore')
+
+
+# File object over a memory mapped file, mmap itself misses the seekable()
+# zipfile relies on before Python 3.13
+class _MappedFile:
+
+    def __init__(self, mapped):
+        self._mapped = mapped
+        self.read = mapped.read
+        self.seek = mapped.seek
+        self.tell = mapped.tell
+
+    def seekable(self):
+        return True
+
+
+@contextmanager
+def _mapped(fp):
+    try:
+        mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        # empty files and file systems without mmap support
+        yield fp
+        return
+    try:
+        yield _MappedFile(mapped)
+    finally:
+        mapped.close()
+
+
+# Yield (member, module, text) for every MIB module of the upload, which may be
+# a zip archive or a single MIB file. progress, if given, is called with the
+# number of members handled so far, their total, the member and whether it
+# was read or skipped.
+def iter_modules(file, progress=None):
+    with open(file, 'rb') as fp, _mapped(fp) as data:
+        if not zipfile.is_zipfile(data):
+            data.seek(0)
+            text = _decode(data.read())
+            module = module_name(text)
+            if progress:
+                progress(1, 1, os.path.basename(file), MEMBER_READ if module else MEMBER_SKIPPED)
+            if module:
+                yield os.path.basename(file), module, text
+            return
+
+        with zipfile.ZipFile(data) as archive:
+            members = [member for member in archive.infolist() if not member.is_dir()]
+            for position, member in enumerate(members, 1):
+                with archive.open(member) as stream:
+                    head = stream.read(HEADER_SIZE)
+                    module = module_name(_decode(head))
+                    if module:
+                        text = _decode(head + stream.read())
+
+                if progress:
+                    progress(position, len(members), member.filename, MEMBER_READ if module else MEMBER_SKIPPED)
+
+                if module:
+                    yield member.filename, module, text
+
+
+# pysmi reader serving the modules read from an upload, by module name
+class MemoryReader(AbstractReader):
+
+    def __init__(self, name, sources, mtime=0):
+        self._name = name
+        self._sources = sources
+        self._mtime = mtime
+
+    def __str__(self):
+        return '%s{"%s"}' % (self.__class__.__name__, self._name)
+
+    def getData(self, mibname, **options):
+        for mibalias, _ in self.getMibVariants(mibname, exts=['']):
+            if mibalias in self._sources:
+                return MibInfo(path='memory://%s/%s' % (self._name, mibalias), file=mibalias,
+                               name=mibalias, mtime=self._mtime), self._sources[mibalias]
+
+        raise error.PySmiReaderFileNotFoundError('source MIB %s not found' % mibname, reader=self)
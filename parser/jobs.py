@@ -0,0 +1,250 @@
+"""
+Background compilation of uploaded MIBs. Jobs are recorded in a local
+SQLite table, which worker processes update as they go, so the web tier
+only has to enqueue a job and read its row back. A worker claims a job
+before running it and keeps its heartbeat fresh while it does, so a job is
+only run again once the process that had it is gone.
+"""  #
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from settings import BASE_URL, UPLOAD_WORKERS
+
+JOBS_DATABASE = BASE_URL.joinpath("uploads", "jobs.db")
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# Seconds between two progress updates of a running job
+PROGRESS_INTERVAL = 0.25
+
+# Seconds between two heartbeats of a running job, and without one after
+# which a job of another host is taken for orphaned
+HEARTBEAT_INTERVAL = 10
+HEARTBEAT_TIMEOUT = 120
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    member TEXT,
+    results TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    owner TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+)
+'''
+
+_prepared = set()
+
+
+# Connection committed and closed on exit
+@contextmanager
+def connect(database):
+    connection = sqlite3.connect(str(database), timeout=30)
+    connection.row_factory = sqlite3.Row
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+# Create the table once per process
+def prepare(database):
+    if str(database) in _prepared:
+        return
+
+    with connect(database) as connection:
+        connection.execute(SCHEMA)
+    _prepared.add(str(database))
+
+
+# host:pid of the calling process
+def owner_id():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+# Whether the job's owner is provably gone: a process of this host that no
+# longer exists, or anything whose heartbeat stopped long ago
+def is_orphaned(job, now):
+    host, _, pid = job['owner'].rpartition(':')
+    if host == socket.gethostname() and pid.isdigit():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    return job['heartbeat'] < now - HEARTBEAT_TIMEOUT
+
+
+def update_job(database, job_id, **fields):
+    fields['updated'] = time.time()
+    with connect(database) as connection:
+        connection.execute(
+            'UPDATE jobs SET %s WHERE id = ?' % ', '.join('%s = ?' % key for key in fields),
+            list(fields.values()) + [job_id]
+        )
+
+
+# Runs in a worker process
+def run_job(database, job_id, filename):
+    # pysmi is only needed by the workers, not by the web tier enqueuing jobs
+    from parser.compiler import compile
+
+    # Claim the job, whoever claims it first runs it
+    now = time.time()
+    with connect(database) as connection:
+        claimed = connection.execute(
+            'UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, updated = ? WHERE id = ? AND status = ?',
+            (JOB_RUNNING, owner_id(), now, now, job_id, JOB_QUEUED)
+        ).rowcount
+    if not claimed:
+        return None
+
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            update_job(database, job_id, heartbeat=time.time())
+
+    heart = threading.Thread(target=beat, daemon=True)
+    heart.start()
+
+    try:
+        return _run_job(database, job_id, filename, compile)
+    finally:
+        stopped.set()
+        heart.join()
+
+
+def _run_job(database, job_id, filename, compile):
+    last = [0]
+
+    def progress(done, total, member, status):
+        now = time.time()
+        if done == total or now - last[0] >= PROGRESS_INTERVAL:
+            last[0] = now
+            update_job(database, job_id, done=done, total=total, member=member)
+
+    try:
+        results = compile(filename, progress=progress)
+
+    except Exception as ex:
+        update_job(database, job_id, status=JOB_FAILED, error='%s: %s' % (ex.__class__.__name__, ex))
+        return JOB_FAILED
+
+    update_job(database, job_id, status=JOB_DONE,
+               results=json.dumps({module: str(status) for module, status in results.items()}))
+    return JOB_DONE
+
+
+class JobQueue:
+
+    def __init__(self, database=JOBS_DATABASE, workers=UPLOAD_WORKERS):
+        self.database = database
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+
+        with connect(database) as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+        prepare(database)
+
+        for job in self.recover():
+            self.pool.submit(run_job, self.database, job['id'], job['filename'])
+
+    # Jobs left queued or running by processes that are gone, taken over by
+    # this one. The takeover only succeeds if the row is still as it was read,
+    # so a job is recovered by a single process.
+    def recover(self):
+        with connect(self.database) as connection:
+            pending = connection.execute(
+                'SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created', (JOB_QUEUED, JOB_RUNNING)
+            ).fetchall()
+
+        now = time.time()
+        recovered = []
+        for job in pending:
+            if not is_orphaned(job, now):
+                continue
+
+            with connect(self.database) as connection:
+                taken = connection.execute(
+                    'UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, updated = ? '
+                    'WHERE id = ? AND status = ? AND owner = ? AND heartbeat = ? AND updated = ?',
+                    (JOB_QUEUED, owner_id(), now, now,
+                     job['id'], job['status'], job['owner'], job['heartbeat'], job['updated'])
+                ).rowcount
+            if taken:
+                recovered.append(job)
+
+        return recovered
+
+    def submit(self, filename):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with connect(self.database) as connection:
+            connection.execute(
+                'INSERT INTO jobs (id, filename, status, created, updated, owner, heartbeat) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, filename, JOB_QUEUED, now, now, owner_id(), now)
+            )
+
+        self.pool.submit(run_job, self.database, job_id, filename)
+
+        return job_id
+
+    def get(self, job_id):
+        return get_job(job_id, self.database)
+
+
+# A job as the status route shows it, or None. Reading a job doesn't need the
+# queue, polling never starts workers or recovers jobs.
+def get_job(job_id, database=JOBS_DATABASE):
+    prepare(database)
+    with connect(database) as connection:
+        job = connection.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+    if job is None:
+        return None
+
+    return {
+        'id': job['id'],
+        'filename': job['filename'],
+        'status': job['status'],
+        'progress': {'done': job['done'], 'total': job['total'], 'member': job['member']},
+        'results': json.loads(job['results']) if job['results'] else None,
+        'error': job['error'],
+        'created': job['created'],
+        'updated': job['updated'],
+    }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+# The job queue of the process, created on first use
+def get_job_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
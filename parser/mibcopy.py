@@ -10,16 +10,27 @@
 import os
 import sys
 import getopt
+import hashlib
+import json
+import multiprocessing
 import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pysmi.reader import FileReader, getReadersFromUrls
 from pysmi.writer import CallbackWriter
 from pysmi.parser import SmiV1CompatParser
 from pysmi.codegen import JsonCodeGen
-from pysmi.compiler import MibCompiler
 from pysmi import debug
 from pysmi import error
 
+# Run as a script, python parser/mibcopy.py, only the parser folder is on the path
+if not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser.context import CompilerContext
+from parser.header import module_name, module_revision
+
 # sysexits.h
 EX_OK = 0
 EX_USAGE = 64
@@ -33,6 +44,9 @@ dstDirectory = None
 cacheDirectory = ''
 dryrunFlag = False
 ignoreErrorsFlag = False
+headerOnlyFlag = False
+manifestFile = None
+jobsCount = 1
 
 helpMessage = """\
 Usage: %s [--help]
@@ -44,12 +58,20 @@ Usage: %s [--help]
       [--cache-directory=<DIRECTORY>]
       [--ignore-errors]
       [--dry-run]
+      [--header-only]
+      [--manifest=<FILE>]
+      [--jobs=<N>]
       <SOURCE [SOURCE...]> <DESTINATION>
 Where:
     URI      - file, zip, http, https, ftp, sftp schemes are supported.
                Use @mib@ placeholder token in URI to refer directly to
                the required MIB module when source does not support
                directory listing (e.g. HTTP).
+    FILE     - where the module name and revision of every file seen are
+               kept between runs, so only changed files are read again.
+               Defaults to .mibcopy-manifest.json in the DESTINATION.
+    N        - number of worker processes reading MIB revisions, 1 by
+               default. Copies are still made one at a time, in order.
 """ % (
     sys.argv[0],
     '|'.join([x for x in sorted(debug.flagMap)])
@@ -62,7 +84,8 @@ try:
         sys.argv[1:], 'hv',
         ['help', 'version', 'verbose', 'quiet', 'debug=',
          'mib-source=', 'mib-stub=',
-         'cache-directory=', 'ignore-errors', 'dry-run']
+         'cache-directory=', 'ignore-errors', 'dry-run',
+         'header-only', 'manifest=', 'jobs=']
     )
 
 except getopt.GetoptError:
@@ -114,6 +137,20 @@ Software documentation and support at http://snmplabs.com/pysmi
     if opt[0] == '--ignore-errors':
         ignoreErrorsFlag = True
 
+    if opt[0] == '--header-only':
+        headerOnlyFlag = True
+
+    if opt[0] == '--manifest':
+        manifestFile = opt[1]
+
+    if opt[0] == '--jobs':
+        try:
+            jobsCount = int(opt[1])
+
+        except ValueError:
+            sys.stderr.write('ERROR: --jobs is not a number\r\n%s\r\n' % helpMessage)
+            sys.exit(EX_USAGE)
+
 if not mibSources:
     mibSources = ['file:///usr/share/snmp/mibs',
                   'http://mibs.snmplabs.com/asn1/@mib@']
@@ -134,6 +171,9 @@ try:
 except OSError:
     pass
 
+if not manifestFile:
+    manifestFile = os.path.join(dstDirectory, '.mibcopy-manifest.json')
+
 # Compiler infrastructure
 
 codeGenerator = JsonCodeGen()
@@ -142,18 +182,19 @@ mibParser = SmiV1CompatParser(tempdir=cacheDirectory)
 
 fileWriter = CallbackWriter(lambda *x: None)
 
+# Readers, grammar and imports already parsed are kept across files
+compilerContext = CompilerContext(
+    mibParser,
+    codeGenerator,
+    fileWriter,
+    *getReadersFromUrls(*mibSources)
+)
 
-def getMibRevision(mibDir, mibFile):
 
-    mibCompiler = MibCompiler(
-        mibParser,
-        codeGenerator,
-        fileWriter
-    )
+def getMibRevision(mibDir, mibFile):
 
-    mibCompiler.addSources(
-        FileReader(mibDir, recursive=False, ignoreErrors=ignoreErrorsFlag),
-        *getReadersFromUrls(*mibSources)
+    mibCompiler = compilerContext.compiler(
+        mibDir, lambda: FileReader(mibDir, recursive=False, ignoreErrors=ignoreErrorsFlag)
     )
 
     try:
@@ -180,6 +221,151 @@ def getMibRevision(mibDir, mibFile):
     raise error.PySmiError('Can\'t read or parse MIB "%s"' % os.path.join(mibDir, mibFile))
 
 
+def getMibHeaderRevision(mibDir, mibFile):
+    """Read MIB module name and revision off its header, without parsing it"""
+    path = os.path.join(mibDir, mibFile)
+
+    try:
+        with open(path, 'rb') as fp:
+            text = fp.read().decode('utf-8', 'ignore')
+
+    except (OSError, IOError):
+        raise error.PySmiError('Can\'t read MIB "%s": %s' % (path, sys.exc_info()[1]))
+
+    mibName = module_name(text)
+    if not mibName:
+        raise error.PySmiError('Can\'t read or parse MIB "%s" header' % path)
+
+    return mibName, module_revision(text) or datetime.fromtimestamp(0)
+
+
+# Manifest of the files seen by previous runs, by absolute path: their
+# modification time, size and digest, and the module name and revision read
+# off them, by header or by a full compile
+try:
+    with open(manifestFile) as fp:
+        manifest = json.load(fp)
+
+except (OSError, IOError, ValueError):
+    manifest = {}
+
+
+def getManifestEntryRevision(entry, mode):
+    """Module name and revision the mode read off the file, None if it
+       hasn't read it yet"""
+    read = entry.get('reads', {}).get(mode)
+    if not read:
+        return None
+
+    return read[0], datetime.strptime(read[1], '%Y-%m-%d %H:%M:%S')
+
+
+def getCachedMibRevision(mibDir, mibFile, headerOnly=False):
+    """Same as getMibRevision but only reads files that changed since the
+       manifest saw them, by modification time and size, then by content.
+       Failures are not kept: they may come from the sources or options of
+       the run rather than from the file"""
+    path = os.path.abspath(os.path.join(mibDir, mibFile))
+    mode = 'header' if headerOnly else 'full'
+
+    entry = manifest.get(path)
+
+    try:
+        stat = os.stat(path)
+
+        if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            revision = getManifestEntryRevision(entry, mode)
+            if revision:
+                return revision
+
+        with open(path, 'rb') as fp:
+            digest = hashlib.sha256(fp.read()).hexdigest()
+
+    except (OSError, IOError):
+        raise error.PySmiError('Can\'t read MIB "%s": %s' % (path, sys.exc_info()[1]))
+
+    reads = entry.get('reads', {}) if entry and entry.get('sha256') == digest else {}
+
+    entry = manifest[path] = dict(mtime=stat.st_mtime, size=stat.st_size, sha256=digest, reads=reads)
+
+    revision = getManifestEntryRevision(entry, mode)
+    if revision:
+        return revision
+
+    try:
+        if headerOnly:
+            mibName, revision = getMibHeaderRevision(mibDir, mibFile)
+
+        else:
+            mibName, revision = getMibRevision(mibDir, mibFile)
+
+    except error.PySmiError:
+        if not reads:
+            del manifest[path]
+        raise
+
+    entry['reads'] = dict(reads, **{mode: [mibName, revision.strftime('%Y-%m-%d %H:%M:%S')]})
+
+    return mibName, revision
+
+
+def getDestinationMibRevision(mibName):
+    """Destination copies are named after their module and were written by
+       this tool, so their header is trusted unless it can't be read"""
+    if not os.path.isfile(os.path.join(dstDirectory, mibName)):
+        raise error.PySmiError('Can\'t read MIB "%s"' % os.path.join(dstDirectory, mibName))
+
+    try:
+        return getCachedMibRevision(dstDirectory, mibName, headerOnly=True)
+
+    except error.PySmiError:
+        return getMibRevision(dstDirectory, mibName)
+
+
+def readMibRevision(mibDir, mibFile):
+    """Module name, revision, error and manifest entry of a source MIB. The
+       error and the entry are handed back rather than raised or stored for
+       the worker processes of --jobs, which don't share the manifest"""
+    try:
+        mibName, revision = getCachedMibRevision(mibDir, mibFile, headerOnly=headerOnlyFlag)
+
+    except error.PySmiError as ex:
+        mibName, revision, failure = None, None, str(ex)
+
+    else:
+        failure = None
+
+    return mibName, revision, failure, manifest.get(os.path.abspath(os.path.join(mibDir, mibFile)))
+
+
+def updateManifest(srcPath, dstPath):
+    """The copy has the same content, hence module and revision, as its source"""
+    srcPath, dstPath = os.path.abspath(srcPath), os.path.abspath(dstPath)
+
+    if srcPath in manifest:
+        stat = os.stat(dstPath)
+        manifest[dstPath] = dict(manifest[srcPath], mtime=stat.st_mtime, size=stat.st_size)
+
+
+def saveManifest():
+    try:
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(manifestFile)), suffix='.tmp')
+
+        try:
+            with os.fdopen(descriptor, 'w') as fp:
+                json.dump(manifest, fp)
+
+            os.replace(temporary, manifestFile)
+
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    except (OSError, IOError):
+        if verboseFlag:
+            sys.stderr.write('Failed to write manifest "%s": %s\r\n' % (manifestFile, sys.exc_info()[1]))
+
+
 def shortenPath(path, maxLength=45):
     if len(path) > maxLength:
         return '...' + path[-maxLength:]
@@ -190,6 +376,15 @@ mibsSeen = mibsCopied = mibsFailed = 0
 
 mibsRevisions = {}
 
+# Revisions are read concurrently with --jobs but handed back in walk order,
+# so which copy of a module wins is the same as when reading them one by one
+if jobsCount > 1 and 'fork' in multiprocessing.get_all_start_methods():
+    # workers are forked as this script can't be imported again to spawn them
+    pool = ProcessPoolExecutor(max_workers=jobsCount, mp_context=multiprocessing.get_context('fork'))
+
+else:
+    pool = None
+
 for srcDirectory in inputMibs:
 
     if verboseFlag:
@@ -203,18 +398,28 @@ for srcDirectory in inputMibs:
                     for dirName, _, mibFiles in os.walk(srcDirectory)
                     for mibFile in mibFiles]
 
-    for srcDirectory, mibFile in mibFiles:
+    if pool:
+        mibRevisions = pool.map(readMibRevision, *zip(*mibFiles),
+                                chunksize=max(1, len(mibFiles) // (jobsCount * 4)))
+
+    else:
+        mibRevisions = (readMibRevision(*mibFile) for mibFile in mibFiles)
+
+    for (srcDirectory, mibFile), (mibName, srcMibRevision, failure, entry) in zip(mibFiles, mibRevisions):
 
         mibsSeen += 1
 
-        # TODO(etingof): also check module OID to make sure there is no name collision
+        if entry:
+            manifest[os.path.abspath(os.path.join(srcDirectory, mibFile))] = entry
 
-        try:
-            mibName, srcMibRevision = getMibRevision(srcDirectory, mibFile)
+        else:
+            manifest.pop(os.path.abspath(os.path.join(srcDirectory, mibFile)), None)
 
-        except error.PySmiError as ex:
+        # TODO(etingof): also check module OID to make sure there is no name collision
+
+        if failure:
             if verboseFlag:
-                sys.stderr.write('Failed to read source MIB "%s": %s\r\n' % (os.path.join(srcDirectory, mibFile), ex))
+                sys.stderr.write('Failed to read source MIB "%s": %s\r\n' % (os.path.join(srcDirectory, mibFile), failure))
 
             if not quietFlag:
                 sys.stderr.write('FAILED %s\r\n' % shortenPath(os.path.join(srcDirectory, mibFile)))
@@ -228,7 +433,7 @@ for srcDirectory in inputMibs:
 
         else:
             try:
-                _, dstMibRevision = getMibRevision(dstDirectory, mibName)
+                _, dstMibRevision = getDestinationMibRevision(mibName)
 
             except error.PySmiError as ex:
                 if verboseFlag:
@@ -261,6 +466,8 @@ for srcDirectory in inputMibs:
         try:
             shutil.copy(os.path.join(srcDirectory, mibFile), os.path.join(dstDirectory, mibName))
 
+            updateManifest(os.path.join(srcDirectory, mibFile), os.path.join(dstDirectory, mibName))
+
         except Exception as ex:
             if verboseFlag:
                 sys.stderr.write('Failed to copy MIB "%s" -> "%s" (%s): "%s"\r\n' % (
@@ -279,6 +486,11 @@ for srcDirectory in inputMibs:
 
             mibsCopied +=1
 
+if pool:
+    pool.shutdown()
+
+saveManifest()
+
 if not quietFlag:
     sys.stderr.write("MIBs seen: %d, copied: %d, failed: %d\r\n" % (mibsSeen, mibsCopied, mibsFailed))
 
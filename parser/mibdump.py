@@ -7,7 +7,9 @@
 #
 # SNMP SMI/MIB data management tool
 #
+import json
 import os
+import socketserver
 import sys
 import getopt
 from pysmi.reader import getReadersFromUrls
@@ -20,6 +22,13 @@ from pysmi.compiler import MibCompiler
 from pysmi import debug
 from pysmi import error
 
+# Run as a script, python parser/mibdump.py, only the parser folder is on the path
+if not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser.mirror import MibMirror, MirrorReader
+from parser.report import CompileReport
+
 
 def start():
     # sysexits.h
@@ -49,6 +58,9 @@ def start():
     ignoreErrorsFlag = False
     buildIndexFlag = False
     writeMibsFlag = True
+    serveFlag = False
+    serveSocket = None
+    reportFile = None
 
     helpMessage = """\
     Usage: {} [--help]
@@ -73,13 +85,24 @@ def start():
         [--no-mib-writes]
         [--generate-mib-texts]
         [--keep-texts-layout]
+        [--serve]
+        [--serve-socket=<PATH>]
+        [--report=<FILE>]
         <MIB-NAME> [MIB-NAME [...]]]
     Where:
         URI      - file, zip, http, https, ftp, sftp schemes are supported. 
                 Use @mib@ placeholder token in URI to refer directly to
                 the required MIB module when source does not support
                 directory listing (e.g. HTTP).
-        FORMAT   - pysnmp, json, null""".format(
+        FORMAT   - pysnmp, json, null
+        PATH     - Unix socket to serve compile requests on.
+        FILE     - JSON report with the status, source, size and parse,
+                code generation and write times of every MIB processed.
+    With --serve, MIB-NAMEs are not compiled, compile requests are read
+    as JSON lines instead, from standard input or from every connection
+    to the socket, like {{"mibs": ["IF-MIB"], "rebuild": true}}. Each is
+    answered with a JSON line holding the status of every MIB processed,
+    and its report when the request has "report": true.""".format(
         sys.argv[0],
         '|'.join([x for x in sorted(debug.flagMap)])
     )
@@ -92,7 +115,8 @@ def start():
             'destination-format=', 'destination-directory=', 'cache-directory=',
             'no-dependencies', 'no-python-compile', 'python-optimization-level=',
             'ignore-errors', 'build-index', 'rebuild', 'dry-run', 'no-mib-writes',
-            'generate-mib-texts', 'disable-fuzzy-source', 'keep-texts-layout']
+            'generate-mib-texts', 'disable-fuzzy-source', 'keep-texts-layout',
+            'serve', 'serve-socket=', 'report=']
         )
 
     except getopt.GetoptError:
@@ -188,8 +212,20 @@ def start():
         if opt[0] == '--keep-texts-layout':
             keepTextsLayout = True
 
+        if opt[0] == '--serve':
+            serveFlag = True
+
+        if opt[0] == '--serve-socket':
+            serveFlag = True
+            serveSocket = opt[1]
+
+        if opt[0] == '--report':
+            reportFile = opt[1]
+
+    # Without explicit sources, MIBs are looked up in the local mirror only
+    mibMirrors = []
     if not mibSources:
-        mibSources = ['https://bestmonitoringtools.com/mibdb/mibs/@mib@.mib']
+        mibMirrors = [MirrorReader(MibMirror().load())]
 
     if inputMibs:
         mibSources = sorted(
@@ -200,7 +236,7 @@ def start():
 
         inputMibs = [os.path.basename(os.path.splitext(x)[0]) for x in inputMibs]
 
-    if not inputMibs:
+    if not inputMibs and not serveFlag:
         sys.stderr.write('ERROR: MIB modules names not specified\r\n%s\r\n' % helpMessage)
         sys.exit(EX_USAGE)
 
@@ -214,10 +250,6 @@ def start():
         if not mibStubs:
             mibStubs = [x for x in PySnmpCodeGen.baseMibs if x not in PySnmpCodeGen.fakeMibs]
 
-        if not mibBorrowers:
-            mibBorrowers = [('https://pysnmp.github.com:443/mibs/notexts/@mib@', False),
-                            ('https://pysnmp.github.com:443/mibs/fulltexts/@mib@', True)]
-
         if not dstDirectory:
             dstDirectory = os.path.expanduser("~")
             if sys.platform[:3] == 'win':
@@ -246,10 +278,6 @@ def start():
         if not mibStubs:
             mibStubs = JsonCodeGen.baseMibs
 
-        if not mibBorrowers:
-            mibBorrowers = [('https://pysnmp.github.io:443/mibs/json/notexts/@mib@', False),
-                            ('https://pysnmp.github.io:443/mibs/fulltexts/@mib@', True)]
-
         if not dstDirectory:
             dstDirectory = os.path.join('.')
 
@@ -268,10 +296,6 @@ def start():
         if not mibStubs:
             mibStubs = NullCodeGen.baseMibs
 
-        if not mibBorrowers:
-            mibBorrowers = [('https://pysnmp.github.io:443/mibs/null/notexts/@mib@', False),
-                            ('https://pysnmp.github.io:443/mibs/null/fulltexts/@mib@', True)]
-
         if not dstDirectory:
             dstDirectory = ''
 
@@ -309,7 +333,7 @@ def start():
     Generate texts in MIBs: {}
     Keep original texts layout: {}
     Try various file names while searching for MIB module: {}
-    """.format(', '.join(mibSources),
+    """.format(', '.join(mibSources + [str(x) for x in mibMirrors]),
         ', '.join([x[0] for x in mibBorrowers if x[1] == genMibTextsFlag]),
         ', '.join(mibSearchers),
         dstDirectory,
@@ -329,47 +353,162 @@ def start():
         keepTextsLayout and 'yes' or 'no',
         doFuzzyMatchingFlag and 'yes' or 'no'))
 
-    # Initialize compiler infrastructure
+    # Initialize compiler infrastructure, kept across requests when serving
 
-    mibCompiler = MibCompiler(
-        SmiV1CompatParser(tempdir=cacheDirectory),
-        codeGenerator,
-        fileWriter
-    )
+    mibParser = SmiV1CompatParser(tempdir=cacheDirectory)
 
-    try:
-        mibCompiler.addSources(
-            *getReadersFromUrls(
-                *mibSources, **dict(fuzzyMatching=doFuzzyMatchingFlag)
+    mibReaders = {}
+
+    def getReaders(*mibUrls):
+        for mibUrl in mibUrls:
+            if mibUrl not in mibReaders:
+                mibReaders[mibUrl] = getReadersFromUrls(mibUrl, **dict(fuzzyMatching=doFuzzyMatchingFlag))
+
+        return [reader for mibUrl in mibUrls for reader in mibReaders[mibUrl]]
+
+    compileOptions = dict(noDeps=nodepsFlag,
+                          rebuild=rebuildFlag,
+                          dryRun=dryrunFlag,
+                          genTexts=genMibTextsFlag,
+                          writeMibs=writeMibsFlag,
+                          ignoreErrors=ignoreErrorsFlag,
+                          buildIndex=buildIndexFlag)
+
+    def compileMibs(mibs, report=None, **options):
+        options = dict(compileOptions, **options)
+
+        # MIBs given by path are looked up in their directory first
+        mibDirectories = sorted({os.path.abspath(os.path.dirname(x)) for x in mibs if os.path.sep in x})
+        mibs = [os.path.basename(os.path.splitext(x)[0]) for x in mibs]
+
+        mibReaders = getReaders(*mibDirectories + mibSources) + mibMirrors
+
+        if report:
+            mibCompiler = MibCompiler(
+                report.parser(mibParser),
+                report.codegen(codeGenerator),
+                report.writer(fileWriter)
             )
-        )
+
+            mibReaders = [report.reader(x) for x in mibReaders]
+
+        else:
+            mibCompiler = MibCompiler(
+                mibParser,
+                codeGenerator,
+                fileWriter
+            )
+
+        mibCompiler.addSources(*mibReaders)
 
         mibCompiler.addSearchers(*searchers)
 
         mibCompiler.addBorrowers(*borrowers)
 
         processed = mibCompiler.compile(
-            *inputMibs, **dict(noDeps=nodepsFlag,
-                            rebuild=rebuildFlag,
-                            dryRun=dryrunFlag,
-                            genTexts=genMibTextsFlag,
-                            textFilter=keepTextsLayout and (lambda symbol, text: text) or None,
-                            writeMibs=writeMibsFlag,
-                            ignoreErrors=ignoreErrorsFlag)
+            *mibs, **dict(noDeps=options['noDeps'],
+                          rebuild=options['rebuild'],
+                          dryRun=options['dryRun'],
+                          genTexts=options['genTexts'],
+                          textFilter=keepTextsLayout and (lambda symbol, text: text) or None,
+                          writeMibs=options['writeMibs'],
+                          ignoreErrors=options['ignoreErrors'])
         )
-        
+
         safe = {}
         for x in sorted(processed):
             if processed[x] != 'failed':
                 safe[x]=processed[x]
-                
-        if buildIndexFlag:
+
+        if options['buildIndex']:
             mibCompiler.buildIndex(
                 safe,
-                dryRun=dryrunFlag,
+                dryRun=options['dryRun'],
                 ignoreErrors=True
             )
 
+        return processed
+
+    def getExitCode(processed):
+        exitCode = EX_OK
+
+        if any(x for x in processed.values() if x == 'missing'):
+            exitCode = EX_MIB_MISSING
+
+        if any(x for x in processed.values() if x == 'failed'):
+            exitCode = EX_MIB_FAILED
+
+        return exitCode
+
+    # One JSON line answered per JSON line of request
+    def serveRequest(line):
+        try:
+            request = json.loads(line)
+            mibs = request['mibs']
+            options = {x: bool(request[x]) for x in compileOptions if x in request}
+
+            if not isinstance(mibs, list) or not all(isinstance(x, str) for x in mibs):
+                raise ValueError('"mibs" is not a list of MIB names')
+
+        except (ValueError, TypeError, KeyError):
+            return {'error': f'bad request: {sys.exc_info()[1]}'}
+
+        report = request.get('report') and CompileReport()
+
+        try:
+            processed = compileMibs(mibs, report=report, **options)
+
+        except error.PySmiError:
+            return {'id': request.get('id'), 'error': str(sys.exc_info()[1])}
+
+        response = {'id': request.get('id'),
+                    'processed': {x: str(processed[x]) for x in sorted(processed)},
+                    'aliases': {x: processed[x].alias for x in sorted(processed) if processed[x] == 'compiled'},
+                    'errors': {x: str(processed[x].error) for x in sorted(processed) if processed[x] == 'failed'},
+                    'exitCode': getExitCode(processed)}
+
+        if report:
+            response['report'] = report.finish(processed)
+
+        return response
+
+    def serveStream(rfile, wfile):
+        for line in rfile:
+            if line.strip():
+                response = json.dumps(serveRequest(line)) + '\n'
+                wfile.write(response if isinstance(line, str) else response.encode())
+                wfile.flush()
+
+    class MibRequestHandler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            serveStream(self.rfile, self.wfile)
+
+    if serveFlag:
+        if serveSocket:
+            if os.path.exists(serveSocket):
+                os.unlink(serveSocket)
+
+            # requests are compiled one at a time, the compiler is shared
+            with socketserver.UnixStreamServer(serveSocket, MibRequestHandler) as server:
+                try:
+                    server.serve_forever()
+
+                except KeyboardInterrupt:
+                    pass
+
+            os.unlink(serveSocket)
+
+        else:
+            serveStream(sys.stdin, sys.stdout)
+
+        sys.exit(EX_OK)
+
+    report = reportFile and CompileReport()
+
+    try:
+        processed = compileMibs(inputMibs, report=report)
+
     except error.PySmiError:
         sys.stderr.write('ERROR: %s\r\n' % sys.exc_info()[1])
         sys.exit(EX_SOFTWARE)
@@ -393,14 +532,15 @@ def start():
             sys.stderr.write("Failed MIBs: %s\n" % "\n ".join(
                 [f'{x} ({processed[x].error})' for x in sorted(processed) if processed[x] == 'failed']))
 
-        exitCode = EX_OK
-
-        if any(x for x in processed.values() if x == 'missing'):
-            exitCode = EX_MIB_MISSING
+        if report:
+            try:
+                with open(reportFile, 'w') as fp:
+                    json.dump(report.finish(processed), fp, indent=2)
 
-        if any(x for x in processed.values() if x == 'failed'):
-            exitCode = EX_MIB_FAILED
+            except OSError:
+                sys.stderr.write(f'ERROR: can\'t write report {reportFile}: {sys.exc_info()[1]}\r\n')
+                sys.exit(EX_SOFTWARE)
 
-        sys.exit(exitCode)
+        sys.exit(getExitCode(processed))
 
 start()
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Local MIB mirror: an index of every MIB module found in the local MIB
+directories (zip archives included), by module and file name, so imports
+are resolved from disk instead of being fetched over the network.
+"""  #
+import json
+import os
+import sys
+import tempfile
+import zipfile
+
+from pysmi import debug
+from pysmi import error
+from pysmi.mibinfo import MibInfo
+from pysmi.reader.base import AbstractReader
+
+from parser.header import module_name
+from settings import BASE_URL
+
+MIRROR_DIRECTORIES = [BASE_URL.joinpath("mibs", "rfc"), BASE_URL.joinpath("uploads", "mibs")]
+
+MIRROR_INDEX = BASE_URL.joinpath("uploads", "mirror-index.json")
+
+# Module headers are expected within the first bytes of a MIB file
+HEADER_SIZE = 65536
+
+
+def _names(filename, text):
+    names = [os.path.splitext(os.path.basename(filename))[0]]
+    module = module_name(text)
+    if module:
+        names.insert(0, module)
+    return names
+
+
+class MibMirror:
+
+    def __init__(self, directories=MIRROR_DIRECTORIES, index=MIRROR_INDEX):
+        self.directories = [str(directory) for directory in directories]
+        self.index = str(index)
+        self.entries = {}
+
+    # Index the directories, reading again only the files whose modification
+    # time or size differ from the ones the index file recorded
+    def load(self):
+        try:
+            with open(self.index, 'r') as file:
+                files = json.load(file)['files']
+            known = {path: (stamp, names) for path, stamp, names in files}
+        except (OSError, ValueError, KeyError, TypeError):
+            known = {}
+
+        return self.build(known)
+
+    # Index every file of the directories, in walk order, reusing the names
+    # known for the files still carrying the same (mtime, size) stamp
+    def build(self, known=None):
+        known = known or {}
+        files = []
+        changed = False
+        for directory in self.directories:
+            for root, dirnames, filenames in os.walk(directory):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+
+                    stamp = [stat.st_mtime_ns, stat.st_size]
+                    if path in known and known[path][0] == stamp:
+                        names = known[path][1]
+                    else:
+                        names = self._scan(path)
+                        changed = True
+                    files.append([path, stamp, names])
+
+        # The first directory a module is found in wins
+        entries = {}
+        for path, _, names in files:
+            for name, member in names:
+                entries.setdefault(name, [path, member])
+        self.entries = entries
+
+        if changed or len(files) != len(known):
+            self._save(files)
+
+        return self
+
+    def _save(self, files):
+        try:
+            descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(self.index), suffix='.tmp')
+            try:
+                with os.fdopen(descriptor, 'w') as file:
+                    json.dump({'files': files}, file)
+                os.replace(temporary, self.index)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+
+        except OSError:
+            debug.logger & debug.flagReader and debug.logger('MIB mirror index %s not written' % self.index)
+
+    # (module name, archive member or None) of every module in the file
+    def _scan(self, path):
+        names = []
+        try:
+            if zipfile.is_zipfile(path):
+                with zipfile.ZipFile(path) as archive:
+                    for member in archive.infolist():
+                        if not member.is_dir():
+                            with archive.open(member) as file:
+                                text = file.read(HEADER_SIZE).decode('utf-8', 'ignore')
+                            names.extend([name, member.filename] for name in _names(member.filename, text))
+                return names
+
+            with open(path, 'rb') as file:
+                text = file.read(HEADER_SIZE).decode('utf-8', 'ignore')
+            names.extend([name, None] for name in _names(path, text))
+
+        except (OSError, zipfile.BadZipFile):
+            debug.logger & debug.flagReader and debug.logger('MIB mirror skips unreadable %s' % path)
+
+        return names
+
+    def get(self, name):
+        return self.entries.get(name)
+
+
+# pysmi reader serving MIBs out of the mirror. Modules that aren't in the
+# mirror are remembered, so they are only looked up once per run.
+class MirrorReader(AbstractReader):
+
+    def __init__(self, mirror):
+        self._mirror = mirror
+        self._missing = set()
+        self._archives = {}
+
+    def __str__(self):
+        return '%s{"%s"}' % (self.__class__.__name__, self._mirror.index)
+
+    def _read(self, path, member):
+        if member is None:
+            with open(path, 'rb') as file:
+                return 'file://%s' % path, os.path.basename(path), os.stat(path).st_mtime, file.read(self.maxMibSize)
+
+        if path not in self._archives:
+            self._archives[path] = zipfile.ZipFile(path)
+        archive = self._archives[path]
+        info = archive.getinfo(member)
+        return 'zip://%s/%s' % (path, member), member, os.stat(path).st_mtime, archive.read(info)
+
+    def getData(self, mibname, **options):
+        if mibname in self._missing:
+            raise error.PySmiReaderFileNotFoundError('source MIB %s not found' % mibname, reader=self)
+
+        for mibalias, _ in self.getMibVariants(mibname, exts=['']):
+            entry = self._mirror.get(mibalias)
+            if not entry:
+                continue
+
+            try:
+                path, filename, mtime, mibData = self._read(*entry)
+
+            except (FileNotFoundError, KeyError):
+                # gone since the mirror was indexed, look further
+                continue
+
+            except (OSError, zipfile.BadZipFile):
+                raise error.PySmiError('MIB mirror %s access error: %s' % (entry[0], sys.exc_info()[1]))
+
+            if len(mibData) == self.maxMibSize:
+                raise error.PySmiError('MIB %s too large' % path)
+
+            return MibInfo(path=path, file=filename, name=mibalias, mtime=mtime), mibData.decode('utf-8', 'ignore')
+
+        self._missing.add(mibname)
+
+        raise error.PySmiReaderFileNotFoundError('source MIB %s not found' % mibname, reader=self)
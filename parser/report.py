@@ -0,0 +1,134 @@
+"""
+Per-module compile report: where each MIB module was read from, its size
+and the time spent parsing it, generating its code and writing it. The
+readers, parser, code generator and writer handed to the compiler are
+wrapped to time their calls, pysmi itself is left as is.
+"""  #
+import time
+
+
+class _Proxy:
+
+    def __init__(self, target, report):
+        self._target = target
+        self._report = report
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __str__(self):
+        return str(self._target)
+
+
+class _Reader(_Proxy):
+
+    def getData(self, mibname, **options):
+        fileInfo, fileData = self._target.getData(mibname, **options)
+        self._report.sources[fileData] = fileInfo.path, len(fileData.encode('utf-8', 'ignore'))
+        self._report.reads[mibname] = fileData
+        return fileInfo, fileData
+
+
+class _Parser(_Proxy):
+
+    def parse(self, data, **options):
+        started = time.perf_counter()
+        try:
+            mibTrees = self._target.parse(data, **options)
+        finally:
+            self._report.parseTimes[data] = self._report.parseTimes.get(data, 0) + time.perf_counter() - started
+
+        for mibTree in mibTrees:
+            self._report.trees[id(mibTree)] = mibTree, data
+
+        return mibTrees
+
+
+class _CodeGen(_Proxy):
+
+    def genCode(self, ast, symbolTable, **kwargs):
+        started = time.perf_counter()
+        mibInfo, mibData = self._target.genCode(ast, symbolTable, **kwargs)
+        entry = self._report.entry(mibInfo.name)
+        entry['codegen'] += time.perf_counter() - started
+
+        if id(ast) in self._report.trees:
+            data = self._report.trees[id(ast)][1]
+            entry['path'], entry['bytes'] = self._report.sources.get(data, (None, len(data)))
+            entry['parse'] = self._report.parseTimes.get(data, 0)
+
+        return mibInfo, mibData
+
+
+class _Writer(_Proxy):
+
+    def putData(self, mibname, data, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._target.putData(mibname, data, *args, **kwargs)
+        finally:
+            self._report.entry(mibname)['write'] += time.perf_counter() - started
+
+
+class CompileReport:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.modules = {}
+        # source path and size, and parse time, by MIB text
+        self.sources = {}
+        self.parseTimes = {}
+        # parse trees and the text they were parsed from, by tree id
+        self.trees = {}
+        # MIB text read, by the name it was looked up with
+        self.reads = {}
+
+    def entry(self, mibname):
+        if mibname not in self.modules:
+            self.modules[mibname] = dict(path=None, bytes=0, parse=0.0, codegen=0.0, write=0.0)
+        return self.modules[mibname]
+
+    def reader(self, reader):
+        return _Reader(reader, self)
+
+    def parser(self, parser):
+        return _Parser(parser, self)
+
+    def codegen(self, codegen):
+        return _CodeGen(codegen, self)
+
+    def writer(self, writer):
+        return _Writer(writer, self)
+
+    # JSON-ready report of the processed status map the compiler returned
+    def finish(self, processed):
+        modules = {}
+        for mibname in sorted(processed):
+            entry = dict(self.entry(mibname), status=str(processed[mibname]))
+            # modules failing to parse or not generated only have their text read
+            if not entry['path'] and mibname in self.reads:
+                data = self.reads[mibname]
+                entry['path'], entry['bytes'] = self.sources[data]
+                entry['parse'] = self.parseTimes.get(data, 0)
+            if processed[mibname] == 'failed':
+                entry['error'] = str(processed[mibname].error)
+            if not entry['path'] and getattr(processed[mibname], 'path', None):
+                entry['path'] = processed[mibname].path
+            modules[mibname] = entry
+
+        statuses = {}
+        for mibname in modules:
+            statuses[modules[mibname]['status']] = statuses.get(modules[mibname]['status'], 0) + 1
+
+        return {
+            'modules': modules,
+            'totals': {
+                'modules': len(modules),
+                'statuses': statuses,
+                'bytes': sum(entry['bytes'] for entry in modules.values()),
+                'parse': sum(self.parseTimes.values()),
+                'codegen': sum(entry['codegen'] for entry in self.modules.values()),
+                'write': sum(entry['write'] for entry in self.modules.values()),
+                'elapsed': time.perf_counter() - self.started,
+            },
+        }
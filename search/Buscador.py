@@ -1,4 +1,14 @@
 import json
+import os
+import sys
+
+# Run as a script, python search/Buscador.py, only the search folder is on the path
+if not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search.corpus import Corpus
+from search.index import InvertedIndex
+from search.store import SUMMARY_FIELDS, NodeStore
 
 # Load source (JSON) data and return it as a Python dictionary
 def load_data_from_json(file_name):
@@ -6,36 +16,51 @@ def load_data_from_json(file_name):
         data = json.load(file)
     return data
 
-# Recursive function that performs the search based on the given search term or filter
-def search_by_filters(node, search_term, exclusion_set, results):
-    # Check if the search term is present in the 'name' or 'description' fields (case-insensitive)
-    if search_term in node['name'].lower() or search_term in node.get('description', '').lower() or search_term in node.get('nodetype', '').lower():
-        # Remove excluded keys (columns) before appending to results
-        filtered_node = {k: v for k, v in node.items() if k not in exclusion_set}
-        results.append(node)
+# Flatten the tree into a node store and register every node in an inverted
+# index, so queries only have to look up posting lists instead of re-walking
+# the whole tree
+def index_tree(data):
+    store = NodeStore()
+    store.add_tree(data["tree"])
+
+    index = InvertedIndex()
+    for node in range(len(store)):
+        index.add(store.names[node], store.descriptions[node], store.nodetypes[node])
 
-    # Recursively search in the children nodes
-    for child in node.get('children', []):
-        search_by_filters(child, search_term, exclusion_set, results)
+    return store, index
 
-def display_results(data, search_term):
-    search_results = []
-    exclusion_set = {'children', 'object type', 'class'}
-    search_by_filters(data["tree"], search_term, exclusion_set, search_results)
+# Search the term in the 'name', 'description' or 'nodetype' fields (case-insensitive).
+# Hits are shown with the given fields only, see store.RECORD_FIELDS
+def display_results(indexed, search_term, fields=SUMMARY_FIELDS):
+    store, index = indexed
 
-    return search_results
+    return [store.project(node, fields) for node in index.search(search_term)]
 
-#Main program, takes input from user and displays the result
+# Children of a node, for expanding the tree one level at a time
+def expand_node(indexed, oid, fields=SUMMARY_FIELDS + ('children',)):
+    store, _ = indexed
+
+    node = store.by_oid.get(oid)
+    if node is None:
+        return []
+    return [store.project(child, fields) for child in store.children(node)]
+
+#Main program, takes input from user and displays the result. Searches every
+#module compiled into uploads/parsed, or the tree file given as argument
 def main():
-    json_file = '/home/alejandro/projects/levelup/parsed/ARUBAWIRED-FAN-MIB_tree.json'
-    data = load_data_from_json(json_file)
+    if len(sys.argv) > 1:
+        indexed = index_tree(load_data_from_json(sys.argv[1]))
+        search = lambda term: display_results(indexed, term)
+    else:
+        corpus = Corpus().load()
+        search = lambda term: [corpus.record(hit, SUMMARY_FIELDS) for hit in corpus.search(term)]
 
     while True:
         search_term = input("Enter the filter to search (or 'exit' to quit): ").lower()
         if search_term == 'exit':
             break
 
-        results = display_results(data, search_term)
+        results = search(search_term)
         if not results:
             print("No results found.")
         else:
@@ -43,4 +68,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
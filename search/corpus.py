@@ -0,0 +1,491 @@
+import heapq
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from search.index import InvertedIndex
+from search.oidtrie import OidTrie
+from search.ranking import RankedIndex, Statistics
+from search.store import RECORD_FIELDS, NodeStore, oid_key
+from settings import BASE_URL, SEARCH_WORKERS, VENDORS
+
+PARSED_FOLDER = BASE_URL.joinpath("uploads", "parsed")
+
+ENTERPRISES = '1.3.6.1.4.1.'
+
+# Modules written by every compile, one JSON line per compile
+JOURNAL_NAME = '.corpus-journal'
+
+# Segments a shard is allowed before it is merged back into one
+SHARD_SEGMENTS = 8
+
+# Query string arguments the search can be narrowed down with
+SEARCH_FILTERS = ('vendor', 'mib_module', 'nodetype', 'status')
+
+
+# Fields the records of the corpus can be projected on
+CORPUS_FIELDS = tuple(RECORD_FIELDS) + ('vendor',)
+
+# Fields of a record the corpus fills in rather than the shard store: the
+# vendor, and the path and children, as the tree spans shards
+CORPUS_ONLY_FIELDS = ('vendor', 'path', 'children')
+
+
+# Enterprise number an OID is under, '' for the OIDs outside enterprises
+def enterprise_of(oid):
+    if oid.startswith(ENTERPRISES):
+        return oid[len(ENTERPRISES):].split('.', 1)[0]
+    return ''
+
+
+def vendor_of(oid):
+    return VENDORS.get(enterprise_of(oid), '')
+
+
+# Fields listed in a comma separated query string argument, None if it is
+# empty. Unknown fields raise ValueError.
+def parse_fields(value):
+    fields = [field.strip() for field in (value or '').split(',') if field.strip()]
+    unknown = [field for field in fields if field not in CORPUS_FIELDS]
+    if unknown:
+        raise ValueError('unknown fields: %s' % ', '.join(unknown))
+    return fields or None
+
+
+# Enterprise a compiled module belongs to: the one of its first symbol under
+# enterprises, '' for the standard MIBs
+def module_enterprise(data):
+    for symbol in data.values():
+        if isinstance(symbol, dict) and symbol.get('oid', '').startswith(ENTERPRISES):
+            return enterprise_of(symbol['oid'])
+    return ''
+
+
+# Modules of one enterprise compiled together, with their own node store and
+# search indexes. Segments are built once and never changed, node ids are
+# local to the segment and follow the OIDs, then the module names.
+class Segment:
+
+    def __init__(self, modules):
+        self.store = store = NodeStore()
+        self.index = InvertedIndex()
+        self.ranking = RankedIndex()
+        self.vendors = []
+
+        store.add_modules(sorted(modules, key=lambda data: data['meta']['module']))
+        for node in range(len(store)):
+            self.index.add(store.names[node], store.descriptions[node], store.nodetypes[node])
+            self.ranking.add(store.names[node], store.descriptions[node])
+            self.vendors.append(sys.intern(vendor_of(store.oids[node])))
+
+        # lowest and highest OID, the store sorts the symbols it is given by OID
+        self.low = oid_key(store.oids[0]) if len(store) else None
+        self.high = oid_key(store.oids[-1]) if len(store) else None
+
+    def __len__(self):
+        return len(self.store)
+
+    # Predicate telling whether a node passes the given filters and isn't of
+    # one of the hidden modules, None if there is nothing to filter on
+    def accepts(self, hidden=frozenset(), **filters):
+        store = self.store
+        checks = []
+        if hidden:
+            checks.append(lambda node: store.modules[node] not in hidden)
+
+        for key, value in filters.items():
+            if not value:
+                continue
+
+            value = value.lower()
+            if key == 'mib_module':
+                modules = {module for name, module in store.module_ids.items() if name.lower() == value}
+                checks.append(lambda node, modules=modules: store.modules[node] in modules)
+                continue
+
+            column = {
+                'vendor': self.vendors,
+                'nodetype': store.nodetypes,
+                'status': store.statuses,
+            }[key]
+            checks.append(lambda node, column=column, value=value: column[node].lower() == value)
+
+        if not checks:
+            return None
+        return lambda node: all(check(node) for check in checks)
+
+    # Ids of the nodes matching the term, narrowed down by the given filters
+    def search(self, term, hidden=frozenset(), **filters):
+        nodes = self.index.search(term)
+
+        accept = self.accepts(hidden, **filters)
+        if accept is not None:
+            nodes = [node for node in nodes if accept(node)]
+
+        return nodes
+
+    # (score, id) of the k nodes most relevant to the query, scored against
+    # the given statistics or the ones of the segment
+    def rank(self, query, k, hidden=frozenset(), statistics=None, **filters):
+        return self.ranking.ranked(query, k, self.accepts(hidden, **filters), statistics)
+
+
+# The segments holding the modules of one enterprise, each with the ids of its
+# modules a later segment superseded. Shards are replaced, never changed, so
+# the searches running meanwhile keep reading the segments they started with.
+class Shard:
+
+    def __init__(self, enterprise, segments=()):
+        self.enterprise = enterprise
+        self.vendor = VENDORS.get(enterprise, '')
+        self.segments = tuple(segments)
+
+    # Names of the modules the shard serves
+    def modules(self):
+        return [
+            name
+            for segment, hidden in self.segments
+            for name, module in segment.store.module_ids.items() if module not in hidden
+        ]
+
+    # Shard with the modules of the given names hidden and the segment, if
+    # any, added. Segments left without a module are dropped.
+    def replaced(self, names, segment=None):
+        segments = []
+        for old, hidden in self.segments:
+            hidden = hidden.union(module for name, module in old.store.module_ids.items() if name in names)
+            if len(hidden) < len(old.store.module_ids):
+                segments.append((old, hidden))
+
+        if segment is not None:
+            segments.append((segment, frozenset()))
+
+        return Shard(self.enterprise, segments)
+
+
+# Every module compiled into the parsed folder, sharded by enterprise, that all
+# the requests of the process share. Searches only read the shards the vendor
+# and module filters leave, several segments are searched at once by a pool of
+# threads. Hits are (segment, node) pairs. OIDs are looked up, and the tree is
+# walked across shards, in a trie over the OIDs of every segment holding the
+# hits of each OID by module name: the first one is the node of the OID, the
+# others take over when its module is superseded by one without the OID.
+#
+# Compiled modules are taken in as a new segment per enterprise, hiding the
+# versions they supersede, and the shards and OID trie they touch are swapped
+# for updated copies: a query sees the corpus from before or after an update,
+# never a mix. Shards are merged back into a single segment once they have
+# more than SHARD_SEGMENTS. Ranking scores every segment against the
+# statistics of the whole corpus, computed once per version of the shards.
+class Corpus:
+
+    def __init__(self, folder=PARSED_FOLDER, workers=SEARCH_WORKERS):
+        self.folder = folder
+        self.journal = folder.joinpath(JOURNAL_NAME)
+        self.journal_offset = 0
+        self.shards = {}
+        # enterprise of every module, by lowercased name
+        self.modules = {}
+        self.oids = OidTrie()
+        # bumped by every update, for what was computed from the corpus to
+        # tell it is stale
+        self.generation = 0
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='search') if workers > 1 else None
+        # the shards the statistics were computed from and the statistics
+        self._statistics = (None, None)
+        self._lock = threading.Lock()
+
+    def load(self):
+        # whatever is compiled from now on is read from the journal
+        self.journal_offset = journal_size(self.journal)
+        self.update(read_modules(sorted(self.folder.glob('*.json'))))
+
+        return self
+
+    # Take in the modules listed in the journal since it was last read
+    def refresh(self):
+        if journal_size(self.journal) == self.journal_offset:
+            return
+
+        with self._lock:
+            if journal_size(self.journal) < self.journal_offset:
+                # the journal was started over, the modules in it are read again
+                self.journal_offset = 0
+
+            with open(self.journal, 'rb') as file:
+                file.seek(self.journal_offset)
+                data = file.read()
+
+            # a line still being written is left for the next time
+            data = data[:data.rfind(b'\n') + 1]
+            self.journal_offset += len(data)
+
+            names = []
+            for line in data.splitlines():
+                names.extend(json.loads(line)['modules'])
+
+            self._update(read_modules(self.folder.joinpath(name + '.json') for name in dict.fromkeys(names)))
+
+    # Add the compiled modules, replacing the ones of the same names
+    def update(self, modules):
+        with self._lock:
+            self._update(modules)
+
+    def _update(self, modules):
+        enterprises = self._apply(modules)
+
+        for enterprise in enterprises:
+            shard = self.shards[enterprise]
+            if len(shard.segments) > SHARD_SEGMENTS:
+                self._apply(read_modules(self.folder.joinpath(name + '.json') for name in shard.modules()))
+
+    # Enterprises of the shards the modules went to
+    def _apply(self, modules):
+        shards = dict(self.shards)
+        enterprises = dict(self.modules)
+        oids = self.oids
+        changes = {}
+
+        names = {data['meta']['module'] for data in modules}
+
+        def holders(oid):
+            return changes[oid] if oid in changes else oids.exact(oid) or ()
+
+        # The versions being superseded are hidden and dropped from their OIDs
+        for enterprise in {enterprises[name.lower()] for name in names if name.lower() in enterprises}:
+            for segment, hidden in shards[enterprise].segments:
+                store = segment.store
+                superseded = {store.module_ids[name] for name in names if name in store.module_ids}.difference(hidden)
+                for node in range(len(store)) if superseded else ():
+                    if store.modules[node] in superseded:
+                        oid = store.oids[node]
+                        changes[oid] = tuple(hit for hit in holders(oid) if hit != (segment, node))
+            shards[enterprise] = shards[enterprise].replaced(names)
+
+        grouped = defaultdict(list)
+        for data in modules:
+            grouped[module_enterprise(data)].append(data)
+
+        for enterprise in sorted(grouped):
+            segment = Segment(grouped[enterprise])
+            shards[enterprise] = shards.get(enterprise, Shard(enterprise)).replaced((), segment)
+            for data in grouped[enterprise]:
+                enterprises[data['meta']['module'].lower()] = enterprise
+
+            # the node of the first module of an OID wins, like in the OID index
+            for node in range(len(segment)):
+                oid = segment.store.oids[node]
+                changes[oid] = tuple(sorted(holders(oid) + ((segment, node),), key=holder_key))
+
+        self.oids = oids.updated((oid, hits or None) for oid, hits in changes.items())
+        self.modules = enterprises
+        self.shards = shards
+        self.generation += 1
+
+        return sorted(grouped)
+
+    # (segment, hidden modules) of the shards (the current ones if not given)
+    # the vendor and module filters leave, by lowest OID
+    def select(self, vendor=None, mib_module=None, shards=None, **filters):
+        shards = self.shards if shards is None else shards
+        if mib_module:
+            enterprise = self.modules.get(mib_module.lower())
+            shards = {enterprise: shards[enterprise]} if enterprise in shards else {}
+
+        return sorted(
+            (
+                (segment, hidden)
+                for shard in shards.values() if not vendor or shard.vendor == vendor.lower()
+                for segment, hidden in shard.segments if len(segment)
+            ),
+            key=lambda item: item[0].low
+        )
+
+    # Results of the function on every segment, in the pool when there are several
+    def map(self, function, segments):
+        if self.executor is None or len(segments) < 2:
+            return [function(segment) for segment in segments]
+        return list(self.executor.map(function, segments))
+
+    # Hits matching the term, narrowed down by the given filters, in OID order.
+    # Segments are mostly apart in the tree, only the hits of the segments whose
+    # OIDs overlap have to be merged.
+    def search(self, term, **filters):
+        def search(item):
+            segment, hidden = item
+            return [(segment, node) for node in segment.search(term, hidden, **filters)]
+
+        segments = self.select(**filters)
+        hits = []
+        group = []
+        high = None
+        for (segment, hidden), found in zip(segments, self.map(search, segments)):
+            if group and segment.low > high:
+                hits.extend(group[0] if len(group) == 1 else heapq.merge(*group, key=hit_key))
+                group = []
+            high = segment.high if not group else max(high, segment.high)
+            group.append(found)
+
+        if group:
+            hits.extend(group[0] if len(group) == 1 else heapq.merge(*group, key=hit_key))
+        return hits
+
+    # Statistics of the nodes the shards serve, leaving out the superseded
+    # modules, computed again only when the shards change
+    def statistics(self, shards):
+        cached = self._statistics
+        if cached[0] is not shards:
+            parts = (
+                (segment.ranking, segment.accepts(hidden))
+                for shard in shards.values() for segment, hidden in shard.segments
+            )
+            cached = self._statistics = (shards, Statistics(parts))
+        return cached[1]
+
+    # The k hits most relevant to the query, narrowed down by the given
+    # filters. Every segment scores its nodes against the statistics of the
+    # whole corpus, so the scores of different segments compare, and hits
+    # scoring the same are in OID order whatever segment they come from. Queries
+    # without a single word the corpus knows of, even at one typo, fall back
+    # to the substring matches in OID order.
+    def rank(self, query, k, **filters):
+        shards = self.shards
+        statistics = self.statistics(shards)
+
+        def rank(item):
+            segment, hidden = item
+            return [(score, segment, node) for score, node in segment.rank(query, k, hidden, statistics, **filters)]
+
+        # every segment ranks its nodes by score, then id, which is OID then
+        # module order
+        ranked = islice(heapq.merge(*self.map(rank, self.select(shards=shards, **filters)), key=rank_key), k)
+        hits = [(segment, node) for score, segment, node in ranked]
+        if not hits:
+            hits = self.search(query, **filters)[:k]
+        return hits
+
+    # Object an OID (e.g. an instance from a walk) belongs to and its index
+    def translate(self, oid):
+        try:
+            hits, index = self.oids.longest_prefix(oid)
+        except ValueError:
+            hits = None
+
+        if hits is None:
+            return {'oid': oid, 'name': None, 'mib_module': None, 'type': None, 'index': None}
+
+        segment, node = hits[0]
+        store = segment.store
+        return {
+            'oid': oid,
+            'name': store.names[node],
+            'mib_module': store.module_name(node),
+            'type': store.types[node],
+            'index': '.'.join(map(str, index)),
+        }
+
+    # Children of the node of the OID, whichever shard they are in, or the
+    # roots without one. None if the OID is not in the corpus or not an OID.
+    def children(self, oid=None):
+        oids = self.oids
+        try:
+            if oid and oids.exact(oid) is None:
+                return None
+        except ValueError:
+            return None
+        return [hits[0] for hits in oids.children(oid or ())]
+
+    # Full record of the hit, or only the given fields. The path and children
+    # span shards, they are read off the OID trie.
+    def record(self, hit, fields=None):
+        segment, node = hit
+        store = segment.store
+        if fields is None:
+            record = store.record(node)
+            record['vendor'] = segment.vendors[node]
+            return record
+
+        record = store.project(node, [field for field in fields if field not in CORPUS_ONLY_FIELDS])
+        if 'vendor' in fields:
+            record['vendor'] = segment.vendors[node]
+        if 'path' in fields:
+            record['path'] = [hits[0][0].store.names[hits[0][1]] for hits in self.oids.prefixes(store.oids[node])]
+        if 'children' in fields:
+            record['children'] = len(self.oids.children(store.oids[node]))
+        return {field: record[field] for field in fields}
+
+
+def hit_key(hit):
+    segment, node = hit
+    return oid_key(segment.store.oids[node]), segment.store.module_name(node)
+
+
+# Order of the hits of an OID: by module name, then node as the store has them
+def holder_key(hit):
+    segment, node = hit
+    return segment.store.module_name(node), node
+
+
+# Best score first, then OID and module order
+def rank_key(ranked):
+    score, segment, node = ranked
+    return -score, oid_key(segment.store.oids[node]), segment.store.module_name(node)
+
+
+# Compiled modules read from the given files, skipping the missing ones, the
+# pysmi index and anything else that isn't a module
+def read_modules(paths):
+    modules = []
+    for path in paths:
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            continue
+        if 'module' in data.get('meta', {}):
+            modules.append(data)
+    return modules
+
+
+def journal_size(path):
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+# Log the modules a compile wrote for the corpus of every process to take them
+# in. Every entry is a single write to a file opened for appending, so entries
+# of concurrent compiles don't interleave.
+def log_compiled(modules, folder=PARSED_FOLDER):
+    if not modules:
+        return
+
+    line = (json.dumps({'modules': sorted(modules)}) + '\n').encode('utf-8')
+    descriptor = os.open(str(folder.joinpath(JOURNAL_NAME)), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(descriptor, line)
+    finally:
+        os.close(descriptor)
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+
+# The corpus of the process, loaded on first use and brought up to date with
+# the modules compiled since
+def get_corpus():
+    global _corpus
+    if _corpus is None:
+        with _corpus_lock:
+            if _corpus is None:
+                _corpus = Corpus().load()
+                return _corpus
+
+    _corpus.refresh()
+    return _corpus
@@ -0,0 +1,65 @@
+from array import array
+from collections import defaultdict
+
+# Length of the n-grams used to answer substring queries
+NGRAM = 3
+
+# Separates the fields of a document so a match can't span two of them
+FIELD_SEPARATOR = '\x00'
+
+
+def ngrams(text, n=NGRAM):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+# Inverted index over lowercased node fields. Documents are identified by the
+# order in which they were added, so posting lists are kept sorted for free and
+# results come back in insertion (tree) order.
+class InvertedIndex:
+
+    def __init__(self):
+        self.texts = []
+        self.grams = defaultdict(lambda: array('I'))
+
+    def __len__(self):
+        return len(self.texts)
+
+    # Register a document made of the given fields and return its id
+    def add(self, *fields):
+        doc = len(self.texts)
+        text = FIELD_SEPARATOR.join(field.lower() for field in fields if field)
+        self.texts.append(text)
+
+        for gram in ngrams(text):
+            if FIELD_SEPARATOR not in gram:
+                self.grams[gram].append(doc)
+
+        return doc
+
+    # Ids of the documents containing the term as a substring of any field
+    def search(self, term):
+        term = term.lower()
+        if not term:
+            return list(range(len(self.texts)))
+
+        texts = self.texts
+        if len(term) < NGRAM:
+            # Too short to be covered by a gram, scan the lowercased texts
+            return [doc for doc, text in enumerate(texts) if term in text]
+
+        postings = []
+        for gram in ngrams(term):
+            posting = self.grams.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+
+        # Grams only narrow the candidates down, the substring must be verified
+        return sorted(doc for doc in candidates if term in texts[doc])
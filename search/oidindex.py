@@ -0,0 +1,291 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+
+from search.oidtrie import oid_arcs
+from settings import BASE_URL
+
+PARSED_FOLDER = BASE_URL.joinpath("uploads", "parsed")
+
+OID_INDEX_NAME = 'oids.index'
+
+OID_INDEX = PARSED_FOLDER.joinpath(OID_INDEX_NAME)
+
+MAGIC = b'MIBEOID1'
+
+# magic, number of records, number of arcs, size of the string table
+HEADER = struct.Struct('<8sIII')
+
+# offset and number of arcs, then offset and length of the name, module,
+# type, node type and description strings
+RECORD = struct.Struct('<12I')
+
+STRING_FIELDS = ('name', 'mib_module', 'type', 'nodetype', 'description')
+
+
+# (arcs, name, module, type, node type, description) of every symbol with an
+# OID of a module compiled by pysmi's JsonCodeGen
+def module_symbols(data):
+    module = data['meta']['module']
+    for symbol in data.values():
+        if isinstance(symbol, dict) and 'oid' in symbol:
+            yield (oid_arcs(symbol['oid']), symbol['name'], module, symbol.get('syntax', {}).get('type', ''),
+                   symbol.get('nodetype', ''), symbol.get('description', ''))
+
+
+# Write the index of the symbols, sorted by OID and module name, and return
+# the number of OIDs. Every symbol of an OID is kept, the first one is looked
+# up, like in the search corpus. Arcs are stored in the byte order of the
+# machine, the index is rebuilt where it is used.
+def write_index(path, symbols):
+    entries = sorted(symbols, key=lambda symbol: (symbol[0], symbol[2]))
+
+    strings = bytearray()
+    offsets = {}
+
+    def string(text):
+        if text not in offsets:
+            encoded = text.encode('utf-8')
+            offsets[text] = len(strings), len(encoded)
+            strings.extend(encoded)
+        return offsets[text]
+
+    records = bytearray()
+    arcs = array('I')
+    oids = 0
+    previous = None
+    for entry in entries:
+        key = entry[0]
+        if key == previous:
+            # the records of an OID share its arcs
+            fields = [len(arcs) - len(key), len(key)]
+        else:
+            fields = [len(arcs), len(key)]
+            arcs.extend(key)
+            oids += 1
+            previous = key
+        for text in entry[1:]:
+            fields.extend(string(text or ''))
+        records.extend(RECORD.pack(*fields))
+
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(str(path)), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, len(entries), len(arcs), len(strings)))
+            file.write(records)
+            file.write(arcs.tobytes())
+            file.write(strings)
+        os.replace(temporary, str(path))
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+    return oids
+
+
+# Index every module compiled into the folder, modules are read in name order
+def build_index(folder=PARSED_FOLDER, path=None):
+    def symbols():
+        for file in sorted(folder.glob('*.json')):
+            with open(file, 'r') as fp:
+                data = json.load(fp)
+            # Skip the pysmi index and anything else that isn't a module
+            if 'module' in data.get('meta', {}):
+                yield from module_symbols(data)
+
+    return write_index(path or folder.joinpath(OID_INDEX_NAME), symbols())
+
+
+# Replace the entries of the given modules with the symbols they now have,
+# reading only their files, or index the folder when there is no index yet.
+# The other modules keep every entry, so an OID a replaced module no longer
+# defines falls to the next module holding it, as build_index would have it.
+# This reads, then rewrites the index: callers hold parser.compiler.parsed_lock
+# so concurrent updates don't lose modules.
+def update_index(modules, folder=PARSED_FOLDER, path=None):
+    path = path or folder.joinpath(OID_INDEX_NAME)
+    try:
+        index = OidIndex(path)
+    except (OSError, ValueError):
+        return build_index(folder, path)
+
+    modules = set(modules)
+    if not modules:
+        oids = index.oids()
+        index.close()
+        return oids
+
+    try:
+        symbols = []
+        for position in range(len(index)):
+            record = index.record(position)
+            if record['mib_module'] not in modules:
+                symbols.append((oid_arcs(record['oid']),) + tuple(record[field] for field in STRING_FIELDS))
+    finally:
+        index.close()
+
+    for module in sorted(modules):
+        try:
+            with open(folder.joinpath(module + '.json'), 'r') as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            continue
+        if 'module' in data.get('meta', {}):
+            symbols.extend(module_symbols(data))
+
+    return write_index(path, symbols)
+
+
+# Memory mapped OID index. Lookups binary search the sorted records and only
+# touch the pages they land on, opening the index doesn't read it. An OID has
+# a record per module defining it, lookups answer with the first.
+class OidIndex:
+
+    def __init__(self, path=OID_INDEX):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.size, arcs, strings = HEADER.unpack_from(self._mapped, 0)
+        if magic != MAGIC:
+            self._mapped.close()
+            raise ValueError('%s is not an OID index' % path)
+
+        start = HEADER.size + self.size * RECORD.size
+        self._arcs = memoryview(self._mapped)[start:start + arcs * 4].cast('I')
+        self._strings = start + arcs * 4
+
+    def __len__(self):
+        return self.size
+
+    # Number of distinct OIDs, records of an OID share its arcs
+    def oids(self):
+        return len(set(RECORD.unpack_from(self._mapped, HEADER.size + position * RECORD.size)[0]
+                       for position in range(self.size)))
+
+    def close(self):
+        self._arcs.release()
+        self._mapped.close()
+
+    def _key(self, position):
+        offset, length = struct.unpack_from('<II', self._mapped, HEADER.size + position * RECORD.size)
+        return tuple(self._arcs[offset:offset + length])
+
+    def _string(self, offset, length):
+        return self._mapped[self._strings + offset:self._strings + offset + length].decode('utf-8')
+
+    # Position of the first record after the arcs
+    def _bisect(self, arcs):
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if arcs < self._key(middle):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    # Position of the first record of the arcs or of the ones after them
+    def _bisect_left(self, arcs):
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < arcs:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def record(self, position):
+        fields = RECORD.unpack_from(self._mapped, HEADER.size + position * RECORD.size)
+        record = {'oid': '.'.join(map(str, self._key(position)))}
+        for field, index in zip(STRING_FIELDS, range(2, len(fields), 2)):
+            record[field] = self._string(fields[index], fields[index + 1])
+        return record
+
+    # Position of the record of the OID or None
+    def exact(self, oid):
+        arcs = oid_arcs(oid)
+        position = self._bisect_left(arcs)
+        if position < self.size and self._key(position) == arcs:
+            return position
+        return None
+
+    # Position of the record of the longest known prefix of the OID, None if
+    # there is none, and the remaining integer arcs, like OidTrie.longest_prefix
+    def longest_prefix(self, oid):
+        arcs = query = oid_arcs(oid)
+        while query:
+            position = self._bisect(query) - 1
+            if position < 0:
+                break
+
+            key = self._key(position)
+            if key == query[:len(key)]:
+                return self._bisect_left(key), arcs[len(key):]
+
+            # the prefix is an ancestor of both, look below where they part
+            common = 0
+            while key[common] == query[common]:
+                common += 1
+            query = query[:common]
+
+        return None, arcs
+
+    # Same answer as Corpus.translate
+    def translate(self, oid):
+        try:
+            position, index = self.longest_prefix(oid)
+        except ValueError:
+            position = None
+
+        if position is None:
+            return {'oid': oid, 'name': None, 'mib_module': None, 'type': None, 'index': None}
+
+        record = self.record(position)
+        return {
+            'oid': oid,
+            'name': record['name'],
+            'mib_module': record['mib_module'],
+            'type': record['type'],
+            'index': '.'.join(map(str, index)),
+        }
+
+
+_index = None
+_index_stamp = None
+_index_lock = threading.Lock()
+
+
+# The OID index of the process, reopened when a compile has rewritten it, or
+# None while there is none
+def get_oid_index(path=OID_INDEX):
+    global _index, _index_stamp
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    stamp = stat.st_ino, stat.st_mtime_ns
+    if stamp != _index_stamp:
+        with _index_lock:
+            if stamp != _index_stamp:
+                # the index being replaced is left to the requests still using it
+                _index = OidIndex(path)
+                _index_stamp = stamp
+    return _index
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--build']:
+        print('%d OIDs indexed' % build_index())
+        sys.argv.pop(1)
+
+    oid_index = OidIndex()
+    for oid in sys.argv[1:]:
+        print(json.dumps(oid_index.translate(oid)))
@@ -0,0 +1,166 @@
+import re
+
+# OID made of decimal arcs without leading zeros, as the trie stores them
+CANONICAL_RE = re.compile(r'(?:(?:0|[1-9][0-9]*)(?:\.(?:0|[1-9][0-9]*))*)?\Z')
+
+
+# Integer arcs of a dotted OID, snmpwalk style leading dot included
+def oid_arcs(oid):
+    return tuple(map(int, _arcs(oid)))
+
+
+# Arcs are kept as their decimal strings inside the trie: they map one to one
+# to the integers, and skipping int() on every arc is most of the lookup cost.
+# Only OIDs that aren't written canonically (leading zeros, spaces) go through
+# int(), which raises ValueError for arcs that aren't numbers at all.
+def _arcs(oid):
+    if isinstance(oid, str):
+        oid = oid.strip('.')
+        if CANONICAL_RE.match(oid):
+            return oid.split('.') if oid else []
+        return [str(int(arc)) for arc in oid.split('.')]
+    return [str(arc) for arc in oid]
+
+
+class _Node:
+    __slots__ = ('value', 'children')
+
+    def __init__(self):
+        self.value = None
+        self.children = {}
+
+
+# Prefix trie over OID arcs. Every operation walks at most one node per arc of
+# the requested OID, so its cost only depends on the OID depth and not on how
+# many OIDs are stored.
+class OidTrie:
+
+    def __init__(self):
+        self.root = _Node()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    # Store a value at the given OID, keeping the existing one unless replace is set
+    def insert(self, oid, value, replace=False):
+        node = self.root
+        for arc in _arcs(oid):
+            child = node.children.get(arc)
+            if child is None:
+                child = node.children[arc] = _Node()
+            node = child
+
+        if node.value is None:
+            self.size += 1
+        elif not replace:
+            return node.value
+
+        node.value = value
+        return value
+
+    # New trie with the given (OID, value) changes made, a None value removing
+    # the OID. Only the nodes on the paths of the changed OIDs are copied, the
+    # rest is shared with this trie, which is left as it was for its readers.
+    def updated(self, changes):
+        trie = OidTrie()
+        trie.size = self.size
+        trie.root.value = self.root.value
+        trie.root.children = dict(self.root.children)
+        copied = {id(trie.root)}
+
+        for oid, value in changes:
+            node = trie.root
+            for arc in _arcs(oid):
+                child = node.children.get(arc)
+                if child is None or id(child) not in copied:
+                    copy = _Node()
+                    if child is not None:
+                        copy.value = child.value
+                        copy.children = dict(child.children)
+                    node.children[arc] = child = copy
+                    copied.add(id(copy))
+                node = child
+
+            trie.size += (value is not None) - (node.value is not None)
+            node.value = value
+
+        return trie
+
+    # Value stored exactly at the OID or None
+    def exact(self, oid):
+        node = self.root
+        for arc in _arcs(oid):
+            node = node.children.get(arc)
+            if node is None:
+                return None
+        return node.value
+
+    # Value of the longest stored prefix of the OID and the remaining integer
+    # arcs (e.g. the index of a table instance). The value is None if no prefix
+    # of the OID is stored at all.
+    def longest_prefix(self, oid):
+        arcs = _arcs(oid)
+        node = self.root
+        value = None
+        depth = matched = 0
+        for arc in arcs:
+            node = node.children.get(arc)
+            if node is None:
+                break
+            matched += 1
+            if node.value is not None:
+                value = node.value
+                depth = matched
+        return value, tuple(map(int, arcs[depth:]))
+
+    # (integer arcs, value) of every OID stored under the given one, itself
+    # included, in OID order
+    def subtree(self, oid=()):
+        arcs = oid_arcs(oid)
+        node = self.root
+        for arc in arcs:
+            node = node.children.get(str(arc))
+            if node is None:
+                return
+
+        stack = [(arcs, node)]
+        while stack:
+            arcs, node = stack.pop()
+            if node.value is not None:
+                yield arcs, node.value
+            stack.extend(
+                (arcs + (arc,), node.children[str(arc)])
+                for arc in sorted(map(int, node.children), reverse=True)
+            )
+
+    # Values stored at the OID and at each of its prefixes, shortest first
+    def prefixes(self, oid):
+        values = []
+        node = self.root
+        for arc in _arcs(oid):
+            node = node.children.get(arc)
+            if node is None:
+                break
+            if node.value is not None:
+                values.append(node.value)
+        return values
+
+    # Values of the closest OIDs stored under the given one, in OID order:
+    # what a tree built from the stored OIDs would have as its children
+    def children(self, oid=()):
+        node = self.root
+        for arc in _arcs(oid):
+            node = node.children.get(arc)
+            if node is None:
+                return []
+
+        values = []
+        stack = [node.children[arc] for arc in sorted(node.children, key=int, reverse=True)]
+        while stack:
+            node = stack.pop()
+            if node.value is not None:
+                values.append(node.value)
+            else:
+                stack.extend(node.children[arc] for arc in sorted(node.children, key=int, reverse=True))
+        return values
@@ -0,0 +1,309 @@
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+# Words of identifiers and texts: camelCase humps, acronyms and numbers, so
+# arubaWiredFanProductName is aruba, wired, fan, product and name
+WORD_RE = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Weight of a word of the name against one of the description
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Query words unknown to the index are replaced by the known words at one
+# edit from them, which count for this much of an exact match
+FUZZY_WEIGHT = 0.5
+FUZZY_MIN_LENGTH = 4
+
+
+def split_words(text):
+    return [word.lower() for word in WORD_RE.findall(text)]
+
+
+# Words of a name, plus the whole name so an exact name query ranks first
+def name_words(name):
+    words = split_words(name)
+    if len(words) > 1:
+        words.append(name.lower())
+    return words
+
+
+def query_words(query):
+    words = []
+    for part in query.split():
+        words.extend(name_words(part))
+    return words
+
+
+# Levenshtein distance between the words, or limit + 1 once it is known to
+# be over the limit
+def edit_distance(first, second, limit):
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+
+    previous = list(range(len(second) + 1))
+    for i, a in enumerate(first, 1):
+        current = [i]
+        for j, b in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+# Postings of a field: documents in id order and the count of the word in each
+class _Field:
+
+    def __init__(self, weight):
+        self.weight = weight
+        self.docs = defaultdict(lambda: array('I'))
+        self.counts = defaultdict(lambda: array('H'))
+        self.lengths = array('H')
+        self.total = 0
+
+    def add(self, doc, words):
+        self.lengths.append(min(len(words), 0xffff))
+        self.total += len(words)
+
+        counts = defaultdict(int)
+        for word in words:
+            counts[word] += 1
+        for word, count in counts.items():
+            self.docs[word].append(doc)
+            self.counts[word].append(min(count, 0xffff))
+
+    # BM25 impact of the word on every document of its postings, given the
+    # number of documents, the average length of the field and the number of
+    # documents the word is in
+    def impacts(self, word, size, average, frequency):
+        docs = self.docs.get(word)
+        if not docs:
+            return {}
+
+        idf = math.log(1 + (size - frequency + 0.5) / (frequency + 0.5))
+        lengths = self.lengths
+        norm = [K1 * (1 - B), K1 * B / average if average else 0]
+        return {
+            doc: self.weight * idf * count * (K1 + 1) / (count + norm[0] + norm[1] * lengths[doc])
+            for doc, count in zip(docs, self.counts[word])
+        }
+
+
+# Postings of a word with the impacts of both fields summed: documents and
+# impacts in id order for random access, and positions by impact (equal ones
+# in id order) for sorted access
+class _Postings:
+
+    def __init__(self, impacts):
+        self.docs = array('I', sorted(impacts))
+        self.impacts = array('d', (impacts[doc] for doc in self.docs))
+        self.order = array('I', sorted(range(len(self.docs)), key=lambda i: -self.impacts[i]))
+
+    def __len__(self):
+        return len(self.docs)
+
+    def impact(self, doc):
+        i = bisect_left(self.docs, doc)
+        if i < len(self.docs) and self.docs[i] == doc:
+            return self.impacts[i]
+        return 0.0
+
+
+# Collection statistics BM25 scores are computed from: the number of
+# documents, and per field the total length and the number of documents every
+# word is in. Taken over several indexes, the scores of their documents can be
+# compared with each other. Parts are (index, live) pairs, the documents live
+# (if given) returns false for are left out, as if removed from the index.
+class Statistics:
+
+    def __init__(self, parts):
+        self.parts = tuple(parts)
+        self.size = 0
+        self.totals = [0, 0]
+        for index, live in self.parts:
+            if live is None:
+                self.size += len(index)
+                for field in range(2):
+                    self.totals[field] += index.fields[field].total
+                continue
+
+            docs = [doc for doc in range(len(index)) if live(doc)]
+            self.size += len(docs)
+            for field in range(2):
+                lengths = index.fields[field].lengths
+                self.totals[field] += sum(lengths[doc] for doc in docs)
+        self._frequencies = {}
+
+    # Average length of the field
+    def average(self, field):
+        return self.totals[field] / self.size if self.size else 0
+
+    # Number of documents the word is in the field of
+    def frequency(self, field, word):
+        key = field, word
+        if key not in self._frequencies:
+            frequency = 0
+            for index, live in self.parts:
+                docs = index.fields[field].docs.get(word, ())
+                frequency += len(docs) if live is None else sum(1 for doc in docs if live(doc))
+            self._frequencies[key] = frequency
+        return self._frequencies[key]
+
+    def known(self, word):
+        return any(self.frequency(field, word) for field in range(2))
+
+
+# BM25 ranked retrieval over the names and descriptions of the nodes.
+# Documents are identified by the order in which they were added, like in
+# InvertedIndex. Documents are scored against the statistics of the index, or
+# the ones given, shared with other indexes. Impact ordered postings are built
+# per word on first use and dropped whenever documents are added or other
+# statistics are given, as the impacts rely on them.
+class RankedIndex:
+
+    def __init__(self):
+        self.size = 0
+        self.fields = (_Field(NAME_WEIGHT), _Field(DESCRIPTION_WEIGHT))
+        self._statistics = None
+        self._postings = (None, {})
+        self._deletes = None
+
+    def __len__(self):
+        return self.size
+
+    def add(self, name, description=''):
+        doc = self.size
+        self.size += 1
+        self.fields[0].add(doc, name_words(name))
+        self.fields[1].add(doc, split_words(description))
+        self._statistics = None
+        self._postings = (None, {})
+        self._deletes = None
+        return doc
+
+    def known(self, word):
+        return any(word in field.docs for field in self.fields)
+
+    # Statistics of the index alone
+    def statistics(self):
+        if self._statistics is None:
+            self._statistics = Statistics(((self, None),))
+        return self._statistics
+
+    def postings(self, word, statistics=None):
+        statistics = statistics or self.statistics()
+        # the statistics and the postings built against them are swapped
+        # together, for concurrent queries never to mix them up
+        cached = self._postings
+        if cached[0] is not statistics:
+            cached = self._postings = (statistics, {})
+
+        postings = cached[1]
+        if word not in postings:
+            impacts = {}
+            for i, field in enumerate(self.fields):
+                frequency = statistics.frequency(i, word)
+                for doc, impact in field.impacts(word, statistics.size, statistics.average(i), frequency).items():
+                    impacts[doc] = impacts.get(doc, 0.0) + impact
+            postings[word] = _Postings(impacts)
+        return postings[word]
+
+    # Known words at one edit from the word, found through the words one
+    # deletion away from each known word
+    def neighbours(self, word):
+        if len(word) < FUZZY_MIN_LENGTH:
+            return set()
+
+        if self._deletes is None:
+            self._deletes = defaultdict(set)
+            for field in self.fields:
+                for known in field.docs:
+                    if len(known) >= FUZZY_MIN_LENGTH - 1:
+                        for deleted in _deletes(known):
+                            self._deletes[deleted].add(known)
+
+        candidates = set(self._deletes.get(word, ()))
+        for deleted in _deletes(word):
+            candidates.update(self._deletes.get(deleted, ()))
+            if self.known(deleted):
+                candidates.add(deleted)
+
+        return {candidate for candidate in candidates if edit_distance(word, candidate, 1) <= 1}
+
+    # Weight of every word of the index the query is looked up with. Words
+    # the statistics know of are not replaced, even if the index lacks them.
+    def expand(self, query, statistics=None):
+        statistics = statistics or self.statistics()
+        weights = defaultdict(float)
+        for word in query_words(query):
+            if statistics.known(word):
+                weights[word] += 1.0
+            else:
+                for neighbour in self.neighbours(word):
+                    weights[neighbour] += FUZZY_WEIGHT
+        return weights
+
+    # Ids of the k best documents for the query, best first, among the ones
+    # accept (if given) returns true for
+    def top(self, query, k, accept=None, statistics=None):
+        return [doc for score, doc in self.ranked(query, k, accept, statistics)]
+
+    # (score, id) of the k best documents, like top. Postings are read in
+    # impact order and every new document is scored in full (Fagin's threshold
+    # algorithm), reading stops once no unseen document can beat the k-th best.
+    def ranked(self, query, k, accept=None, statistics=None):
+        statistics = statistics or self.statistics()
+        lists = [(weight, self.postings(word, statistics)) for word, weight in self.expand(query, statistics).items()]
+        lists = [(weight, postings) for weight, postings in lists if len(postings)]
+        if not lists or k <= 0:
+            return []
+
+        best = []
+        seen = set()
+        depth = 0
+        while True:
+            threshold = 0.0
+            last = 0
+            for weight, postings in lists:
+                if depth >= len(postings):
+                    continue
+
+                i = postings.order[depth]
+                threshold += weight * postings.impacts[i]
+
+                doc = postings.docs[i]
+                last = max(last, doc)
+                if doc in seen:
+                    continue
+                seen.add(doc)
+                if accept is not None and not accept(doc):
+                    continue
+
+                score = sum(factor * other.impact(doc) for factor, other in lists)
+                entry = (score, -doc)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+
+            depth += 1
+            # An unseen document only scores the threshold if it is in every
+            # list still read with the impact read last, and equal impacts are
+            # in id order: it can't come before a k-th best of the same score
+            # and an id up to the last one read.
+            if not threshold or (len(best) == k and best[0] >= (threshold, -last)):
+                break
+
+        return [(score, -doc) for score, doc in sorted(best, reverse=True)]
@@ -0,0 +1,103 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from settings import RESULT_CACHE_BYTES, RESULT_CACHE_TTL
+
+# Bytes an entry is charged on top of its body, for its key and bookkeeping
+ENTRY_OVERHEAD = 256
+
+
+# Encoded response body, its ETag and the headers to send along
+class CachedResult:
+    __slots__ = ('body', 'etag', 'headers', 'expires')
+
+    def __init__(self, body, headers, expires):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.headers = headers
+        self.expires = expires
+
+    def __len__(self):
+        return len(self.body) + ENTRY_OVERHEAD
+
+
+# LRU cache of encoded responses, bounded by the bytes of their bodies. Entries
+# expire after ttl seconds and are all dropped when the corpus they were
+# computed from changes generation.
+class ResultCache:
+
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES, ttl=RESULT_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.generation = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    # Drop every entry if the generation isn't the one they were computed at
+    def validate(self, generation):
+        if generation != self.generation:
+            with self._lock:
+                if generation != self.generation:
+                    self._entries.clear()
+                    self.size = 0
+                    self.generation = generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if entry.expires <= time.monotonic():
+                del self._entries[key]
+                self.size -= len(entry)
+                return None
+
+            self._entries.move_to_end(key)
+            return entry
+
+    # Cache the body under the key, evicting the least recently used entries
+    # over the size bound, and return its entry. Bodies larger than the whole
+    # cache are not kept.
+    def put(self, key, body, headers=None):
+        entry = CachedResult(body, headers or {}, time.monotonic() + self.ttl)
+        if len(entry) > self.max_bytes:
+            return entry
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+
+            self._entries[key] = entry
+            self.size += len(entry)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+        return entry
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# The result cache of the process, created on first use
+def get_result_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
@@ -0,0 +1,209 @@
+import sys
+from array import array
+
+NO_NODE = -1
+
+
+# How every field a record can be projected on is read off the store
+RECORD_FIELDS = {
+    'name': lambda store, node: store.names[node],
+    'oid': lambda store, node: store.oids[node],
+    'class': lambda store, node: store.classes[node],
+    'nodetype': lambda store, node: store.nodetypes[node],
+    'type': lambda store, node: store.types[node],
+    'status': lambda store, node: store.statuses[node],
+    'maxaccess': lambda store, node: store.maxaccess[node],
+    'description': lambda store, node: store.descriptions[node],
+    'mib_module': lambda store, node: store.module_name(node),
+    'path': lambda store, node: store.path(node),
+    'children': lambda store, node: store.child_count(node),
+}
+
+# What a search hit is shown with unless asked otherwise
+SUMMARY_FIELDS = ('oid', 'name', 'type', 'mib_module', 'path')
+
+
+def oid_key(oid):
+    return tuple(int(arc) for arc in oid.split('.'))
+
+
+# Compact, flattened storage for MIB nodes. Every attribute lives in its own
+# parallel list indexed by node id and the tree shape is kept as parent,
+# first-child and next-sibling indices, so walking the tree is plain integer
+# hopping instead of recursing through nested dicts. Repeated strings (names,
+# classes, types, modules...) are interned so every module shares them.
+class NodeStore:
+
+    def __init__(self):
+        self.names = []
+        self.oids = []
+        self.classes = []
+        self.nodetypes = []
+        self.types = []
+        self.statuses = []
+        self.maxaccess = []
+        self.descriptions = []
+        self.modules = array('i')
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.last_child = array('i')
+        self.module_names = []
+        self.module_ids = {}
+        self.by_oid = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def module_id(self, module):
+        if module not in self.module_ids:
+            self.module_ids[module] = len(self.module_names)
+            self.module_names.append(sys.intern(module))
+        return self.module_ids[module]
+
+    # Append a node under the given parent and return its id
+    def add(self, parent, name, oid, nodeclass='', nodetype='', syntax='',
+            status='', maxaccess='', description='', module=NO_NODE):
+        node = len(self.names)
+        self.names.append(sys.intern(name))
+        self.oids.append(oid)
+        self.classes.append(sys.intern(nodeclass))
+        self.nodetypes.append(sys.intern(nodetype))
+        self.types.append(sys.intern(syntax))
+        self.statuses.append(sys.intern(status))
+        self.maxaccess.append(sys.intern(maxaccess))
+        self.descriptions.append(description)
+        self.modules.append(module)
+        self.parent.append(parent)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self.last_child.append(NO_NODE)
+
+        if parent != NO_NODE:
+            if self.first_child[parent] == NO_NODE:
+                self.first_child[parent] = node
+            else:
+                self.next_sibling[self.last_child[parent]] = node
+            self.last_child[parent] = node
+
+        self.by_oid.setdefault(oid, node)
+
+        return node
+
+    # Load a nested tree (see mockups/upload_mib.json), keeping children order
+    def add_tree(self, tree, module=''):
+        module = self.module_id(module) if module else NO_NODE
+        stack = [(NO_NODE, tree)]
+        while stack:
+            parent, item = stack.pop()
+            node = self.add(
+                parent, item['name'], item.get('oid', ''),
+                nodeclass=item.get('class', ''),
+                nodetype=item.get('nodetype', ''),
+                syntax=item.get('syntax', {}).get('type', ''),
+                status=item.get('status', ''),
+                maxaccess=item.get('maxaccess', ''),
+                description=item.get('description', ''),
+                module=module
+            )
+            stack.extend((node, child) for child in reversed(item.get('children', [])))
+
+    # Load a module compiled by pysmi's JsonCodeGen
+    def add_module(self, data):
+        return self.add_modules([data])[0]
+
+    # Load modules compiled by pysmi's JsonCodeGen. Their symbols are flat, so
+    # the symbols of every module are sorted by OID together and hooked under
+    # the closest already known ancestor, whichever module defined it
+    def add_modules(self, modules):
+        ids = []
+        symbols = []
+        for data in modules:
+            module = self.module_id(data['meta']['module'])
+            ids.append(module)
+            symbols.extend(
+                (oid_key(symbol['oid']), module, symbol)
+                for symbol in data.values() if isinstance(symbol, dict) and 'oid' in symbol
+            )
+
+        symbols.sort(key=lambda item: item[0])
+
+        for _, module, symbol in symbols:
+            self.add(
+                self.closest_ancestor(symbol['oid']), symbol['name'], symbol['oid'],
+                nodeclass=symbol.get('class', ''),
+                nodetype=symbol.get('nodetype', ''),
+                syntax=symbol.get('syntax', {}).get('type', ''),
+                status=symbol.get('status', ''),
+                maxaccess=symbol.get('maxaccess', ''),
+                description=symbol.get('description', ''),
+                module=module
+            )
+
+        return ids
+
+    def closest_ancestor(self, oid):
+        by_oid = self.by_oid
+        while '.' in oid:
+            oid = oid.rsplit('.', 1)[0]
+            if oid in by_oid:
+                return by_oid[oid]
+        return NO_NODE
+
+    def roots(self):
+        return [node for node, parent in enumerate(self.parent) if parent == NO_NODE]
+
+    def children(self, node):
+        child = self.first_child[node]
+        while child != NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    def child_count(self, node):
+        return sum(1 for _ in self.children(node))
+
+    # Pre-order walk of the subtree rooted at node (or of every root)
+    def walk(self, node=NO_NODE):
+        first_child = self.first_child
+        next_sibling = self.next_sibling
+        stack = list(reversed(self.roots())) if node == NO_NODE else [node]
+        while stack:
+            node = stack.pop()
+            yield node
+            child = first_child[node]
+            siblings = []
+            while child != NO_NODE:
+                siblings.append(child)
+                child = next_sibling[child]
+            stack.extend(reversed(siblings))
+
+    # Names of the nodes from the root down to the given one
+    def path(self, node):
+        path = []
+        while node != NO_NODE:
+            path.append(self.names[node])
+            node = self.parent[node]
+        path.reverse()
+        return path
+
+    def module_name(self, node):
+        module = self.modules[node]
+        return self.module_names[module] if module != NO_NODE else ''
+
+    # Record of the node with only the given fields (see RECORD_FIELDS)
+    def project(self, node, fields):
+        return {field: RECORD_FIELDS[field](self, node) for field in fields}
+
+    def record(self, node):
+        module = self.modules[node]
+        return {
+            'name': self.names[node],
+            'oid': self.oids[node],
+            'class': self.classes[node],
+            'nodetype': self.nodetypes[node],
+            'type': self.types[node],
+            'status': self.statuses[node],
+            'maxaccess': self.maxaccess[node],
+            'description': self.descriptions[node],
+            'mib_module': self.module_names[module] if module != NO_NODE else '',
+        }
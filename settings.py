@@ -1,3 +1,29 @@
+import os
 from pathlib import Path
 
-BASE_URL = Path(__file__).parent
\ No newline at end of file
+BASE_URL = Path(__file__).parent
+
+# Uploaded MIBs and everything generated from them: the compiled modules, PDF
+# exports, job database and mirror index. Created on boot, never versioned.
+UPLOAD_FOLDER = BASE_URL.joinpath("uploads")
+
+# Private enterprise numbers (1.3.6.1.4.1.<number>) of the known vendors
+VENDORS = {
+    "34578": "hpe",
+    "632": "aruba",
+    "54345": "cisco",
+    "65346546": "ibm",
+}
+
+# Worker processes used to compile the MIBs of an upload, 1 compiles serially
+COMPILE_WORKERS = int(os.environ.get("MIBE_COMPILE_WORKERS", 1))
+
+# Worker processes compiling uploads in the background
+UPLOAD_WORKERS = int(os.environ.get("MIBE_UPLOAD_WORKERS", 2))
+
+# Threads searching the shards of the corpus, 1 searches them one after the other
+SEARCH_WORKERS = int(os.environ.get("MIBE_SEARCH_WORKERS", 1))
+
+# Bytes of encoded /search and /vendor responses kept in memory, and for how many seconds
+RESULT_CACHE_BYTES = int(os.environ.get("MIBE_RESULT_CACHE_BYTES", 64 * 1024 * 1024))
+RESULT_CACHE_TTL = int(os.environ.get("MIBE_RESULT_CACHE_TTL", 300))